@@ -1,34 +1,256 @@
+import json
+import os
+import threading
+import time
 from google import genai
+from google.genai import types
 from PIL import Image
-from adt.utility import get_api_key, draw_grid, parse_moves
+from adt.utility import get_api_key, draw_grid, parse_moves, actions_to_dxdy
+from adt.locator import ColorLocator, parse_target_color
+from adt.executor import RequestExecutor, DeadlineExceeded
+from adt.prompts import (POINT_SCHEMA, grid_template, layout_template, consult_template,
+                         point_grid_template, point_layout_template)
 from model.inference import CursorPredictor
 
+OBSERVATIONS = ["image", "text", "text+image"]
+PROTOCOLS = ["moves", "point"]
+DEFAULT_CALIBRATION = "model/checkpoints/router_calibration.json"
+
+class GeminiBackend:
+    """
+    Thin wrapper around the genai client. Anything with the same generate_content signature
+    (e.g. adt.fake_backend.FakeBackend) can be passed to Agent instead.
+    """
+    # recreate a context cache this many seconds before its TTL runs out
+    CACHE_RENEW_MARGIN = 60.0
+    # after a failed cache creation, wait this long before trying again (doubling up to the max)
+    CACHE_RETRY_DELAY = 30.0
+    CACHE_RETRY_MAX = 900.0
+
+    def __init__(self, api_key=None, cache_ttl="3600s", cache_deadline=10.0):
+        self.client = genai.Client(api_key=api_key or get_api_key())
+        self.cache_ttl = cache_ttl
+        # cache creation is a network call of its own; bound it so no request waits long on it
+        self.cache_executor = RequestExecutor(deadline=cache_deadline, max_retries=1)
+        self.configs = {}  # (model, system instruction, schema) -> (GenerateContentConfig, expiry)
+        self.cache_keys = {}  # cache name -> configs key, to drop a cache the server no longer has
+        self.cache_failures = {}  # configs key -> consecutive failed creations
+        self.creating = set()  # configs keys whose cache is being created right now
+        self.lock = threading.Lock()
+
+    def prompt_config(self, model, system_instruction, response_schema=None):
+        """
+        Config that carries the static system instruction. The first call per (model, instruction)
+        tries to create a server-side context cache for it; models or prompts that don't qualify
+        for caching (e.g. below the minimum token count) get a plain system_instruction instead,
+        and creation is tried again after a growing backoff. The cache is recreated shortly
+        before its TTL expires. Calls made while another thread creates the cache don't wait
+        for it and send the system instruction themselves.
+        response_schema: if given, the answer is constrained to JSON matching this schema.
+        """
+        key = (model, system_instruction, json.dumps(response_schema, sort_keys=True))
+        with self.lock:
+            entry = self.configs.get(key)
+            if entry is not None and time.monotonic() < entry[1]:
+                return entry[0]
+            # the renewal margin keeps an expiring cache usable while another thread replaces it
+            if key in self.creating and entry is not None:
+                return entry[0]
+            creating = key in self.creating
+            if not creating:
+                if entry is not None:
+                    self.cache_keys.pop(entry[0].cached_content, None)
+                self.creating.add(key)
+
+        output = {}
+        if response_schema is not None:
+            output = {"response_mime_type": "application/json", "response_schema": response_schema}
+        plain = types.GenerateContentConfig(system_instruction=system_instruction, **output)
+        if creating:
+            return plain
+
+        try:
+            cache = self.cache_executor.call(
+                self.client.caches.create,
+                model=model,
+                config=types.CreateCachedContentConfig(system_instruction=system_instruction, ttl=self.cache_ttl),
+            )
+        except Exception as e:
+            with self.lock:
+                failures = self.cache_failures[key] = self.cache_failures.get(key, 0) + 1
+                delay = min(self.CACHE_RETRY_MAX, self.CACHE_RETRY_DELAY * 2 ** (failures - 1))
+                self.configs[key] = (plain, time.monotonic() + delay)
+                self.creating.discard(key)
+            print(f"Context cache unavailable for {model} ({e}); sending system instruction per call, "
+                  f"retrying in {delay:.0f}s")
+            return plain
+
+        ttl = float(self.cache_ttl.rstrip("s"))
+        config = types.GenerateContentConfig(cached_content=cache.name, **output)
+        with self.lock:
+            self.configs[key] = (config, time.monotonic() + ttl - self.CACHE_RENEW_MARGIN)
+            self.cache_keys[cache.name] = key
+            self.cache_failures.pop(key, None)
+            self.creating.discard(key)
+        return config
+
+    def _renewed(self, config, exc):
+        """
+        A fresh config if `exc` says the context cache behind `config` is gone (expired or
+        deleted server-side), else None.
+        """
+        name = getattr(config, "cached_content", None)
+        code = getattr(exc, "code", None)
+        if name is None or not (code == 404 or (code == 400 and "cache" in str(exc).lower())):
+            return None
+        with self.lock:
+            key = self.cache_keys.pop(name, None)
+            if key is not None:
+                self.configs.pop(key, None)
+        if key is None:
+            return None
+        model, system_instruction, schema = key
+        return self.prompt_config(model, system_instruction, json.loads(schema))
+
+    def generate_content(self, model, contents, config=None):
+        try:
+            return self.client.models.generate_content(model=model, contents=contents, config=config)
+        except Exception as e:
+            renewed = self._renewed(config, e)
+            if renewed is None:
+                raise
+            return self.client.models.generate_content(model=model, contents=contents, config=renewed)
+
+    def generate_content_stream(self, model, contents, config=None):
+        started = False
+        try:
+            for chunk in self.client.models.generate_content_stream(model=model, contents=contents, config=config):
+                started = True
+                yield chunk
+        except Exception as e:
+            renewed = None if started else self._renewed(config, e)
+            if renewed is None:
+                raise
+            yield from self.client.models.generate_content_stream(model=model, contents=contents, config=renewed)
+
+class ConfidenceRouter:
+    """
+    Decides per command whether ImageShot's answer is trusted or the command goes to Gemini.
+    ImageShot is sampled with MC-dropout; commands whose prediction spread (pixels) is at most
+    `threshold` are answered locally. The threshold comes from eval/calibrate.py.
+    """
+    def __init__(self, threshold=10.0, samples=16):
+        self.threshold = threshold
+        self.samples = samples
+        self.stats = {"local": 0, "escalated": 0}
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_CALIBRATION):
+        """Router with the calibrated threshold at path, or the default threshold if there is none."""
+        if not os.path.exists(path):
+            print(f"No router calibration at {path}, using default threshold")
+            return cls()
+        with open(path, 'r') as f:
+            calib = json.load(f)
+        return cls(threshold=calib["threshold"], samples=calib.get("samples", 16))
+
+    def is_confident(self, std) -> bool:
+        local = std <= self.threshold
+        self.stats["local" if local else "escalated"] += 1
+        return local
+
 class Agent:
-    def __init__(self, arrsize=100):
+    def __init__(self, arrsize=100, observation="image", image_scale=0.5, predictor="local",
+                 server_socket=None, executor=None, backend=None, router=None, protocol="moves"):
+        """
+        observation: what Gemini is shown.
+            "image": the screenshot with a grid drawn on it
+            "text": only a JSON layout of the scene (needs a scene passed to ask)
+            "text+image": the layout plus the screenshot downscaled by image_scale, without grid
+        predictor: "local" loads ImageShot in this process, "server" sends frames to a running
+            model.server InferenceServer at server_socket (default model.server.DEFAULT_SOCKET).
+        executor: adt.executor.RequestExecutor applying deadline, retry, rate limit and hedging
+            policy to Gemini calls. When a Gemini call misses its deadline or fails for good, ask() falls
+            back to ImageShot and counts it in self.fallbacks.
+        backend: object serving generate_content; defaults to a GeminiBackend created on first use.
+        router: ConfidenceRouter for the "Routed" mode; defaults to the calibration in DEFAULT_CALIBRATION.
+        protocol: how Gemini answers.
+            "moves": a list of 10px moves and clicks, parsed with parse_moves
+            "point": JSON coordinates of the target, compiled locally into one move per axis and a click
+        """
+        if observation not in OBSERVATIONS:
+            raise ValueError(f"Unknown observation {observation!r}, expected one of {OBSERVATIONS}")
+        if protocol not in PROTOCOLS:
+            raise ValueError(f"Unknown protocol {protocol!r}, expected one of {PROTOCOLS}")
+        self.protocol = protocol
         self.arrsize = arrsize
+        self.observation = observation
+        self.image_scale = image_scale
+        self.predictor_backend = predictor
+        self.server_socket = server_socket
         self.predictor = None
+        self.locator = None
+        self.executor = executor or RequestExecutor()
+        self.backend = backend
+        self.router = router
+        self.last_route = None  # "local" or "gemini" for the latest Routed ask
+        self.last_response = None  # raw text of the latest Gemini answer from ask()
+        self.last_usage = None  # token counts of the latest Gemini call
+        self.usage_totals = {}
+        self.fallbacks = {}  # Gemini failures answered by ImageShot instead: "deadline" / "error" -> count
+
+    def _get_backend(self):
+        if self.backend is None:
+            self.backend = GeminiBackend()
+        return self.backend
 
     def _get_predictor(self):
         if self.predictor is None:
-            self.predictor = CursorPredictor()
+            if self.predictor_backend == "server":
+                from model.server import InferenceClient, DEFAULT_SOCKET
+                self.predictor = InferenceClient(self.server_socket or DEFAULT_SOCKET)
+            else:
+                self.predictor = CursorPredictor()
         return self.predictor
 
+    def close(self):
+        """Release the predictor's resources (the inference client's socket and shared memory)."""
+        if self.predictor is not None and hasattr(self.predictor, "close"):
+            self.predictor.close()
+        self.predictor = None
+
+    def _get_router(self):
+        if self.router is None:
+            self.router = ConfidenceRouter.from_file()
+        return self.router
+
+    def _route_local(self, img_path, points):
+        """
+        Routed mode: run ImageShot with uncertainty. Returns (actions, confident).
+        Predictors without uncertainty support (the inference server, or architectures without
+        dropout layers) always escalate.
+        """
+        pred = self._get_predictor()
+        router = self._get_router()
+        if not hasattr(pred, "predict_with_uncertainty"):
+            router.stats["escalated"] += 1
+            return [], False
+        try:
+            idx, idy, std = pred.predict_with_uncertainty(img_path, router.samples)
+        except ValueError as e:
+            print(f"No ImageShot uncertainty ({e}), escalating")
+            router.stats["escalated"] += 1
+            return [], False
+        points.append({"label": f"ImageShot ±{std:.0f}", "dx": idx, "dy": idy, "color": "green"})
+        return self._dxdy_to_actions(idx, idy), router.is_confident(std)
+
+    def _get_locator(self):
+        if self.locator is None:
+            self.locator = ColorLocator()
+        return self.locator
+
     def _actions_to_dxdy(self, actions):
-        dx, dy = 0, 0
-        for action in actions:
-            parts = action.split()
-            if parts[0] == "move":
-                direction = parts[1]
-                try:
-                    amount = int(parts[2])
-                except (IndexError, ValueError):
-                    amount = 1
-                step = 10 * amount
-                if direction == "left": dx -= step
-                elif direction == "right": dx += step
-                elif direction == "up": dy -= step
-                elif direction == "down": dy += step
-        return dx, dy
+        return actions_to_dxdy(actions)
 
     def _dxdy_to_actions(self, dx, dy):
         actions = []
@@ -49,8 +271,107 @@ class Agent:
         actions.append("click")
         return actions
 
-    def ask(self, cmd: str, img_path: str, mode: str = "Gemini") -> tuple[list[str], list[dict]]:
+    def _gemini_contents(self, cmd: str, img_path: str, scene=None):
+        """
+        Build the request for the configured observation mode.
+        Falls back to the image observation when no scene is available.
+        Returns (template, contents): the template's system instruction goes in the request
+        config, contents only hold the image and the per-call suffix.
+        """
+        if self.observation == "image" or scene is None:
+            # kept in memory: no PNG round trip, and concurrent asks don't share a temp file
+            image = draw_grid(img_path, None, self.arrsize)
+            template = point_grid_template(self.arrsize) if self.protocol == "point" else grid_template(self.arrsize)
+            return template, [image, template.render(cmd=cmd)]
+
+        template = point_layout_template() if self.protocol == "point" else layout_template()
+        prompt = template.render(layout=scene.to_layout(), cmd=cmd)
+        if self.observation == "text":
+            return template, [prompt]
+
+        image = Image.open(img_path)
+        w, h = image.size
+        image = image.resize((max(1, int(w * self.image_scale)), max(1, int(h * self.image_scale))))
+        return template, [image, prompt]
+
+    def _generate(self, model, template, contents, response_schema=None):
+        """
+        Call the backend through the executor with the template's system instruction
+        (context-cached where the backend supports it) and record token usage.
+        """
+        backend = self._get_backend()
+        if hasattr(backend, "prompt_config"):
+            if response_schema is not None:
+                config = backend.prompt_config(model, template.system, response_schema)
+            else:
+                config = backend.prompt_config(model, template.system)
+        else:
+            config = None
+            contents = contents[:-1] + [template.system + "\n\n" + contents[-1]]
+        response = self.executor.call(backend.generate_content, model=model, contents=contents, config=config)
+        self._record_usage(response)
+        return response
+
+    def _record_usage(self, response):
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            self.last_usage = None
+            return
+        self.last_usage = {
+            "input_tokens": usage.prompt_token_count or 0,
+            "cached_tokens": getattr(usage, "cached_content_token_count", None) or 0,
+            "output_tokens": usage.candidates_token_count or 0,
+        }
+        for k, v in self.last_usage.items():
+            self.usage_totals[k] = self.usage_totals.get(k, 0) + v
+
+    def _cursor_position(self, img_path, scene=None):
+        """
+        Cursor center in the coordinates the model was shown: the screenshot for the image
+        observation, the scene layout otherwise. Falls back to the other source if one is missing.
+        """
+        if self.observation != "image" and scene is not None:
+            return scene.cursor
+        cursor = self._get_locator().find_cursor(img_path)
+        if cursor is None and scene is not None:
+            return scene.cursor
+        return cursor
+
+    def _point_to_actions(self, response_text, img_path, scene=None):
+        """
+        Compile a point-protocol answer into a minimal plan: one move per axis, rounded to the
+        nearest 10px step, then a click. Returns (actions, (dx, dy)), or ([], None) when the
+        model found nothing or the cursor can't be located.
         """
+        try:
+            point = json.loads(response_text)
+        except (TypeError, ValueError):
+            print(f"Unparseable point answer: {response_text!r}")
+            return [], None
+        if not isinstance(point, dict) or not point.get("found"):
+            return [], None
+        x, y = point.get("x"), point.get("y")
+        # only the Gemini backend enforces the schema; scripted or fallback answers may not match it
+        if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in (x, y)):
+            print(f"Off-schema point answer: {response_text!r}")
+            return [], None
+        cursor = self._cursor_position(img_path, scene)
+        if cursor is None:
+            print("Cursor not found, cannot compile point answer")
+            return [], None
+        dx, dy = x - cursor[0], y - cursor[1]
+        actions = []
+        steps_x, steps_y = round(dx / 10), round(dy / 10)
+        if steps_x:
+            actions.append(f"move {'right' if steps_x > 0 else 'left'} {abs(steps_x)}")
+        if steps_y:
+            actions.append(f"move {'down' if steps_y > 0 else 'up'} {abs(steps_y)}")
+        actions.append("click")
+        return actions, (dx, dy)
+
+    def ask(self, cmd: str, img_path: str, mode: str = "Gemini", scene=None) -> tuple[list[str], list[dict]]:
+        """
+        scene: optional adt.scene.Scene of the current screen, used by the text observation modes.
         Returns:
             actions: list of action strings
             points: list of dicts {'label': str, 'dx': float, 'dy': float, 'color': str}
@@ -58,37 +379,63 @@ class Agent:
         points = []
         gemini_actions = []
         imageshot_actions = []
+        self.last_response = None
+        self.last_usage = None
+        self.last_route = None
 
-        # Run Gemini if needed
-        if mode in ["Gemini", "Hybrid"]:
-            client = genai.Client(api_key=get_api_key())
-            draw_grid(img_path, "img/grid.png", self.arrsize)
-            image = Image.open("img/grid.png")
+        # Routed: answer locally when ImageShot is confident, escalate to Gemini otherwise
+        if mode == "Routed":
+            imageshot_actions, confident = self._route_local(img_path, points)
+            self.last_route = "local" if confident else "gemini"
+            if confident:
+                return imageshot_actions, points
 
-            prompt = f"""You are a model specializing in GUI work. Attached is an image and an instruction. The image has a grid of redlines of it, each symbolizing {self.arrsize} pixels. The cursor is that of a black square. Your two actions are as follows:
-1. Click the screen.
-2. Move the cursor by 10px (1/{self.arrsize/10} red grid units) up/down/left/right.
-
-Here is your goal: {cmd}
-Output a specific list of actions of [click] or [move left/down/up/right amount], or state NA if not possible. An example output may be Response: [move right 1, move left 20, click]. Only include the list of actions and nothing else. Now go."""
+        # Run Gemini if needed
+        fallback = False
+        if mode in ["Gemini", "Hybrid", "Routed"]:
+            template, contents = self._gemini_contents(cmd, img_path, scene)
 
-            response = client.models.generate_content(
-                model="gemini-2.0-flash-exp",
-                contents=[image, prompt]
-            )
-            gemini_actions = parse_moves(response.text)
-            gdx, gdy = self._actions_to_dxdy(gemini_actions)
-            points.append({"label": "Gemini", "dx": gdx, "dy": gdy, "color": "blue"})
+            try:
+                if self.protocol == "point":
+                    response = self._generate("gemini-2.0-flash-exp", template, contents, POINT_SCHEMA)
+                    self.last_response = response.text
+                    gemini_actions, offset = self._point_to_actions(response.text, img_path, scene)
+                    if offset is not None:
+                        points.append({"label": "Gemini", "dx": offset[0], "dy": offset[1], "color": "blue"})
+                else:
+                    response = self._generate("gemini-2.0-flash-exp", template, contents)
+                    self.last_response = response.text
+                    gemini_actions = parse_moves(response.text)
+                    gdx, gdy = self._actions_to_dxdy(gemini_actions)
+                    points.append({"label": "Gemini", "dx": gdx, "dy": gdy, "color": "blue"})
+            except Exception as e:
+                # deadline, retries exhausted on 429/503, or a non-retryable error: degrade, don't raise
+                kind = "deadline" if isinstance(e, DeadlineExceeded) else "error"
+                self.fallbacks[kind] = self.fallbacks.get(kind, 0) + 1
+                print(f"Gemini call failed ({type(e).__name__}: {e}), falling back to ImageShot")
+                fallback = True
 
         # Run ImageShot if needed
-        if mode in ["ImageShot", "Hybrid"]:
+        if mode in ["ImageShot", "Hybrid"] or (fallback and not imageshot_actions):
             pred = self._get_predictor()
             idx, idy = pred.predict(img_path)
             imageshot_actions = self._dxdy_to_actions(idx, idy)
             points.append({"label": "ImageShot", "dx": idx, "dy": idy, "color": "green"})
 
+        # Run the color-segmentation locator if needed (no model, exact on the synthetic desktop)
+        locator_actions = []
+        if mode == "Locator":
+            color = parse_target_color(cmd)
+            found = self._get_locator().locate(img_path, color) if color else None
+            if found is not None:
+                ldx, ldy = found
+                locator_actions = self._dxdy_to_actions(ldx, ldy)
+                points.append({"label": "Locator", "dx": ldx, "dy": ldy, "color": "gray"})
+
         # Decide which actions to return
-        if mode == "ImageShot":
+        if mode == "Locator":
+            return locator_actions, points
+        elif mode == "ImageShot" or fallback:
             return imageshot_actions, points
         elif mode == "Hybrid":
             # For Hybrid, we return Gemini actions but show both points
@@ -99,15 +446,11 @@ Output a specific list of actions of [click] or [move left/down/up/right amount]
 
 
     def consult(self, cmd: str, img_path: str) -> str:
-        client = genai.Client(api_key=get_api_key())
-        draw_grid(img_path, "img/grid.png", self.arrsize)
-
-        image = Image.open("img/grid.png")
-
-        prompt = f"You are a model specializing in GUI work. Attached is an image and an instruction. The image has a grid of red lines of it, each symbolizing {self.arrsize}  pixels. The cursor is that of a black square. Here is the instruction: {cmd}. How much red squares do you think you need to move the cursor to complete the instruction? Now let's say you can only move 10px. How many of those 10px moves do you need?"
+        image = draw_grid(img_path, None, self.arrsize)
+        template = consult_template(self.arrsize)
 
-        response = client.models.generate_content(
-            model="gemini-3-flash-preview",
-            contents=[image, prompt]
-        )
+        try:
+            response = self._generate("gemini-3-flash-preview", template, [image, template.render(cmd=cmd)])
+        except Exception as e:
+            return f"(consult unavailable: {e})"
         return response.text
@@ -0,0 +1,117 @@
+import os
+import mss
+from PIL import Image
+
+
+def _overlaps(a, b) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def _coalesce(rects: list[tuple]) -> list[tuple]:
+    """
+    Merge overlapping (x1, y1, x2, y2) rectangles into their bounding boxes until none overlap.
+    """
+    rects = list(rects)
+    merged = True
+    while merged:
+        merged = False
+        out = []
+        for r in rects:
+            for i, o in enumerate(out):
+                if _overlaps(r, o):
+                    out[i] = (min(r[0], o[0]), min(r[1], o[1]), max(r[2], o[2]), max(r[3], o[3]))
+                    merged = True
+                    break
+            else:
+                out.append(r)
+        rects = out
+    return rects
+
+
+class FrameCapture:
+    """
+    Incremental window capture.
+    Keeps a single mss instance and the last captured frame. The first grab (or any grab after the
+    window moved or resized) is a full one; after that only rectangles reported through mark_dirty
+    are re-grabbed and pasted into the cached frame. `version` increases whenever the cached frame
+    changes, so downstream consumers can skip work when it did not.
+    """
+
+    def __init__(self, pad: int = 4):
+        self.pad = pad  # extra pixels around each dirty rect (relief borders, antialiasing)
+        self.sct = None
+        self.frame = None
+        self.geometry = None
+        self.dirty = []
+        self.version = 0
+        self._saved = {}  # path -> version last written there
+
+    def mark_dirty(self, x1, y1, x2, y2):
+        """
+        Mark a rectangle in window coordinates as changed since the last grab.
+        """
+        p = self.pad
+        self.dirty.append((int(x1) - p, int(y1) - p, int(x2) + p, int(y2) + p))
+
+    def invalidate(self):
+        """
+        Force the next grab to capture the whole window.
+        """
+        self.frame = None
+
+    def _grab(self, left, top, width, height) -> Image.Image:
+        if self.sct is None:
+            self.sct = mss.mss()
+        shot = self.sct.grab({"top": top, "left": left, "width": width, "height": height})
+        return Image.frombytes("RGB", shot.size, shot.bgra, "raw", "BGRX")
+
+    def grab(self, left: int, top: int, width: int, height: int) -> Image.Image:
+        """
+        Return the current window frame, re-grabbing only what changed.
+        left/top are the window's screen position, width/height its size.
+        """
+        geometry = (left, top, width, height)
+        if self.frame is None or geometry != self.geometry:
+            self.frame = self._grab(left, top, width, height)
+            self.geometry = geometry
+            self.dirty.clear()
+            self.version += 1
+            return self.frame
+
+        if not self.dirty:
+            return self.frame
+
+        changed = False
+        for x1, y1, x2, y2 in _coalesce(self.dirty):
+            x1, y1 = max(0, x1), max(0, y1)
+            x2, y2 = min(width, x2), min(height, y2)
+            if x2 <= x1 or y2 <= y1:
+                continue
+            patch = self._grab(left + x1, top + y1, x2 - x1, y2 - y1)
+            # a rect can be marked dirty without its pixels actually changing
+            if patch.tobytes() != self.frame.crop((x1, y1, x2, y2)).tobytes():
+                self.frame.paste(patch, (x1, y1))
+                changed = True
+        self.dirty.clear()
+        if changed:
+            self.version += 1
+        return self.frame
+
+    def save(self, path: str) -> bool:
+        """
+        Write the cached frame as PNG, unless this version was already written to path.
+        Returns True if the file was (re)written.
+        """
+        if self.frame is None:
+            return False
+        if self._saved.get(path) == self.version and os.path.exists(path):
+            return False
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.frame.save(path)
+        self._saved[path] = self.version
+        return True
+
+    def close(self):
+        if self.sct is not None:
+            self.sct.close()
+            self.sct = None
@@ -0,0 +1,176 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# HTTP status codes worth retrying: throttling and transient server errors
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a call could not complete within its deadline, retries and hedges included."""
+
+
+def is_retryable(exc: Exception) -> bool:
+    """
+    google.genai errors carry the HTTP status in `code`; other clients tend to use `status_code`.
+    Network-level timeouts and connection failures are always retried.
+    """
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    if code in RETRYABLE_CODES:
+        return True
+    return isinstance(exc, (TimeoutError, ConnectionError))
+
+
+class TokenBucket:
+    """
+    Allows `rate` calls per second on average with bursts of up to `burst` calls.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self) -> bool:
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def acquire(self, deadline: float | None = None) -> bool:
+        """
+        Block until a token is available. Returns False if `deadline` (time.monotonic) passes first.
+        """
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait_for = (1 - self.tokens) / self.rate
+            if deadline is not None and time.monotonic() + wait_for > deadline:
+                return False
+            time.sleep(wait_for)
+
+
+class RequestExecutor:
+    """
+    Runs remote calls with a deadline, jittered exponential backoff on retryable errors,
+    optional token-bucket rate limiting, a cap on concurrent in-flight calls, and optional
+    hedging: if an attempt has not answered after the observed p95 latency, a duplicate is
+    sent and whichever finishes first wins.
+
+    Calls that miss their deadline keep running in the background (threads cannot be
+    cancelled), but their results are discarded.
+    """
+
+    def __init__(self, deadline: float = 30.0, max_retries: int = 3, base_delay: float = 0.5,
+                 max_delay: float = 8.0, rate: float | None = None, burst: int = 1,
+                 max_concurrency: int = 4, hedge: bool = False, hedge_quantile: float = 0.95,
+                 hedge_min_samples: int = 20, hedge_delay: float | None = None):
+        """
+        deadline: seconds a call may take in total.
+        rate/burst: token bucket limit in calls per second (None disables it).
+        hedge_delay: fixed delay before hedging; by default the hedge_quantile of recent
+            latencies is used once hedge_min_samples calls have been observed.
+        """
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_delay = hedge_delay
+        self.latencies = deque(maxlen=200)
+        self.pool = ThreadPoolExecutor(max_workers=max_concurrency * 2)
+        self.stats = {"calls": 0, "retries": 0, "hedges": 0, "deadline_exceeded": 0, "failed": 0}
+
+    def _hedge_after(self) -> float | None:
+        if not self.hedge:
+            return None
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        if len(self.latencies) < self.hedge_min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(self.hedge_quantile * len(ordered)))]
+
+    def _run(self, fn, args, kwargs):
+        with self.slots:
+            start = time.monotonic()
+            result = fn(*args, **kwargs)
+            self.latencies.append(time.monotonic() - start)
+            return result
+
+    def _attempt(self, fn, args, kwargs, deadline_at: float):
+        if self.bucket is not None and not self.bucket.acquire(deadline_at):
+            raise DeadlineExceeded("rate limit wait exceeds deadline")
+
+        pending = {self.pool.submit(self._run, fn, args, kwargs)}
+        hedge_after = self._hedge_after()
+        hedged = False
+        error = None
+
+        while pending:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                break
+            timeout = remaining
+            if hedge_after is not None and not hedged:
+                timeout = min(timeout, hedge_after)
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is None:
+                    return f.result()
+                error = f.exception()
+            if not done and not hedged and hedge_after is not None:
+                # primary is slower than usual; race a duplicate against it
+                if self.bucket is None or self.bucket.try_acquire():
+                    pending.add(self.pool.submit(self._run, fn, args, kwargs))
+                    self.stats["hedges"] += 1
+                hedged = True
+
+        if error is not None and not pending:
+            raise error
+        raise DeadlineExceeded(f"no response within {self.deadline:.1f}s")
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Call fn(*args, **kwargs) under this executor's policy and return its result.
+        Raises DeadlineExceeded, or the last error if it is not retryable or retries ran out.
+        """
+        self.stats["calls"] += 1
+        deadline_at = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            try:
+                return self._attempt(fn, args, kwargs, deadline_at)
+            except DeadlineExceeded:
+                self.stats["deadline_exceeded"] += 1
+                raise
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    self.stats["failed"] += 1
+                    raise
+                # full jitter: sleep a random fraction of the exponential backoff
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+                if time.monotonic() + delay >= deadline_at:
+                    self.stats["deadline_exceeded"] += 1
+                    raise DeadlineExceeded(f"retry backoff exceeds deadline after: {e}") from e
+                time.sleep(delay)
+                attempt += 1
+                self.stats["retries"] += 1
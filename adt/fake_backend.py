@@ -0,0 +1,182 @@
+import itertools
+import json
+import random
+import re
+import time
+
+import numpy as np
+from PIL import Image
+
+from adt.locator import ColorLocator, parse_target_color
+
+
+class FakeServerError(Exception):
+    """Mimics google.genai.errors.ServerError/ClientError: the HTTP status is in `code`."""
+
+    def __init__(self, code: int, message: str = "fake backend error"):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class FakeUsage:
+    def __init__(self, prompt_token_count: int, candidates_token_count: int):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.cached_content_token_count = 0
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+
+class FakeConfig:
+    """Stands in for GenerateContentConfig; the system instruction is treated as context-cached."""
+
+    def __init__(self, system_instruction: str, response_schema: dict | None = None):
+        self.system_instruction = system_instruction
+        self.response_schema = response_schema
+
+
+class FakeResponse:
+    def __init__(self, text: str, usage_metadata: FakeUsage = None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+def moves_text(dx: float, dy: float) -> str:
+    """Format a (dx, dy) pixel offset the way the move-list prompt asks for."""
+    actions = []
+    steps_x, steps_y = round(dx / 10), round(dy / 10)
+    if steps_x:
+        actions.append(f"move {'right' if steps_x > 0 else 'left'} {abs(steps_x)}")
+    if steps_y:
+        actions.append(f"move {'down' if steps_y > 0 else 'up'} {abs(steps_y)}")
+    actions.append("click")
+    return "Response: [" + ", ".join(actions) + "]"
+
+
+class FakeBackend:
+    """
+    Offline stand-in for the Gemini API with the same generate_content signature Agent uses.
+
+    Answers come from `script` when given (a list of response texts, cycled, or a callable taking
+    the request contents), otherwise from an oracle: the JSON layout in the prompt if there is one,
+    else the ColorLocator run on the attached image. Latency, error rate and streaming are
+    configurable so load, retry and caching behavior can be measured without network or quota.
+    """
+
+    def __init__(self, script=None, latency: str = "lognormal", latency_ms: float = 800.0,
+                 latency_sigma: float = 0.5, error_rate: float = 0.0, error_codes=(503, 429),
+                 stream_chunks: int = 4, time_scale: float = 1.0, seed: int | None = None):
+        """
+        latency: "constant", "normal", "lognormal" or "exponential", centered on latency_ms.
+        latency_sigma: relative spread (std / mean for normal, sigma of log for lognormal).
+        time_scale: multiplies every sleep, e.g. 0 to run at full speed with no delays.
+        """
+        self.script = itertools.cycle(script) if isinstance(script, (list, tuple)) else script
+        self.latency = latency
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.error_codes = list(error_codes)
+        self.stream_chunks = stream_chunks
+        self.time_scale = time_scale
+        self.rng = random.Random(seed)
+        self.locator = ColorLocator()
+        self.calls = 0
+
+    def _sample_latency(self) -> float:
+        mean = self.latency_ms / 1000.0
+        if self.latency == "constant":
+            value = mean
+        elif self.latency == "normal":
+            value = self.rng.gauss(mean, mean * self.latency_sigma)
+        elif self.latency == "exponential":
+            value = self.rng.expovariate(1.0 / mean)
+        else:  # lognormal with median at latency_ms
+            value = mean * self.rng.lognormvariate(0.0, self.latency_sigma)
+        return max(0.0, value) * self.time_scale
+
+    def _locate(self, contents):
+        """
+        (target center, cursor center) for the request, from the layout in the prompt or the
+        first image, or None if the instruction names no color or the target isn't there.
+        """
+        texts = [c for c in contents if isinstance(c, str)]
+        images = [c for c in contents if isinstance(c, Image.Image)]
+        prompt = texts[-1] if texts else ""
+        goal = re.search(r"(?:goal|instruction):\s*([^.\n]*)", prompt)
+        color = parse_target_color(goal.group(1) if goal else prompt)
+        if color is None:
+            return None
+
+        layout = re.search(r'\{"canvas".*\}', prompt)
+        if layout:
+            scene = json.loads(layout.group(0))
+            for b in scene["buttons"]:
+                if b["color"] == color:
+                    x1, y1, x2, y2 = b["box"]
+                    return ((x1 + x2) / 2, (y1 + y2) / 2), tuple(scene["cursor"])
+            return None
+
+        if images:
+            frame = self.locator.load(np.asarray(images[0].convert("RGB")))
+            button, cursor = self.locator.find_button(frame, color), self.locator.find_cursor(frame)
+            if button is not None and cursor is not None:
+                return button[:2], cursor
+        return None
+
+    def _oracle(self, contents, config=None) -> str:
+        found = self._locate(contents)
+        if getattr(config, "response_schema", None) is not None:
+            if found is None:
+                return json.dumps({"found": False, "x": 0, "y": 0})
+            (tx, ty), _ = found
+            return json.dumps({"found": True, "x": round(tx), "y": round(ty)})
+        if found is None:
+            return "NA"
+        (tx, ty), (cx, cy) = found
+        return moves_text(tx - cx, ty - cy)
+
+    def _respond(self, contents, config=None) -> str:
+        if self.script is None:
+            return self._oracle(contents, config)
+        if callable(self.script):
+            return self.script(contents)
+        return next(self.script)
+
+    def prompt_config(self, model: str, system_instruction: str, response_schema: dict | None = None) -> FakeConfig:
+        return FakeConfig(system_instruction, response_schema)
+
+    def _usage(self, contents, text: str, config=None) -> FakeUsage:
+        # rough Gemini accounting: ~4 characters per text token, 258 tokens per image
+        prompt_tokens = sum(len(c) // 4 if isinstance(c, str) else 258 for c in contents)
+        cached = len(config.system_instruction) // 4 if config is not None else 0
+        usage = FakeUsage(prompt_tokens + cached, max(1, len(text) // 4))
+        usage.cached_content_token_count = cached
+        return usage
+
+    def _maybe_fail(self):
+        if self.error_rate and self.rng.random() < self.error_rate:
+            raise FakeServerError(self.rng.choice(self.error_codes))
+
+    def generate_content(self, model: str, contents, config=None) -> FakeResponse:
+        self.calls += 1
+        time.sleep(self._sample_latency())
+        self._maybe_fail()
+        text = self._respond(contents, config)
+        return FakeResponse(text, self._usage(contents, text, config))
+
+    def generate_content_stream(self, model: str, contents, config=None):
+        """
+        Yields the answer in stream_chunks pieces. Sampled latency is split between time to first
+        chunk (half) and the gaps between the remaining chunks.
+        """
+        self.calls += 1
+        total = self._sample_latency()
+        time.sleep(total / 2)
+        self._maybe_fail()
+        text = self._respond(contents, config)
+        n = max(1, self.stream_chunks)
+        size = max(1, -(-len(text) // n))
+        for i in range(0, len(text), size):
+            if i:
+                time.sleep(total / 2 / max(1, n - 1))
+            yield FakeResponse(text[i:i + size])
@@ -0,0 +1,195 @@
+import math
+import random
+from collections import defaultdict
+
+BUTTON_COLORS = ["green", "red", "orange", "blue", "purple"]
+BUTTON_SIZE = (40, 30)
+MIN_DIST = 80  # preferred separation between button centers on sparse desktops
+
+
+def default_min_dist(n: int, width: int, height: int, button_size=BUTTON_SIZE) -> float:
+    """
+    Center separation for n buttons: MIN_DIST when there is room, shrinking with density so
+    Poisson-disk sampling can still fit n points, but never below the button diagonal
+    (any two centers at least that far apart cannot overlap). The margin kept from the canvas
+    edges equals the separation, so only the inner area counts.
+    """
+    diagonal = math.hypot(*button_size)
+    n = max(n, 1)
+    d = min(MIN_DIST, 0.7 * math.sqrt(width * height / n))
+    while d > diagonal and 0.7 * math.sqrt(max(0, (width - 2 * d) * (height - 2 * d)) / n) < d:
+        d -= 1
+    return max(diagonal, d)
+
+
+def button_colors(n: int, colors=BUTTON_COLORS, unique: str | None = None) -> list[str]:
+    """
+    Colors for n buttons, cycling through the palette when n exceeds it.
+    unique: a color given to one button only, so an instruction naming it is unambiguous
+        (palette order is kept while n fits the palette).
+    """
+    if unique is None or (n <= len(colors) and unique in colors[:n]):
+        return [colors[i % len(colors)] for i in range(n)]
+    rest = [c for c in colors if c != unique]
+    return [unique] + [rest[i % len(rest)] for i in range(n - 1)]
+
+
+def _far_enough(grid, x, y, i, j, min_dist) -> bool:
+    for di in range(-2, 3):
+        for dj in range(-2, 3):
+            p = grid.get((i + di, j + dj))
+            if p is not None and math.hypot(x - p[0], y - p[1]) < min_dist:
+                return False
+    return True
+
+
+def _outside(x, y, avoid) -> bool:
+    return not any(math.hypot(x - ax, y - ay) <= r for ax, ay, r in avoid)
+
+
+def _bridson(width, height, min_dist, margin, avoid, rng, k):
+    """
+    Bridson's active-list Poisson-disk sampling: grow outwards from a random seed point,
+    trying k candidates in the annulus [min_dist, 2 * min_dist] around each active point and
+    retiring it once all k fail. Returns every point placed, which covers the area maximally.
+    Coordinates are rounded to whole pixels before they are checked.
+    """
+    lo_x, hi_x = margin, width - margin
+    lo_y, hi_y = margin, height - margin
+    cell = min_dist / math.sqrt(2)
+    grid = {}
+    points = []
+
+    def add(x, y):
+        grid[(int(x // cell), int(y // cell))] = (x, y)
+        points.append((x, y))
+
+    for _ in range(k):
+        x, y = round(rng.uniform(lo_x, hi_x)), round(rng.uniform(lo_y, hi_y))
+        if lo_x <= x <= hi_x and lo_y <= y <= hi_y and _outside(x, y, avoid):
+            add(x, y)
+            break
+    active = list(points)
+    while active:
+        idx = rng.randrange(len(active))
+        px, py = active[idx]
+        for _ in range(k):
+            angle = rng.uniform(0, 2 * math.pi)
+            radius = rng.uniform(min_dist, 2 * min_dist)
+            x, y = round(px + radius * math.cos(angle)), round(py + radius * math.sin(angle))
+            if not (lo_x <= x <= hi_x and lo_y <= y <= hi_y) or not _outside(x, y, avoid):
+                continue
+            if _far_enough(grid, x, y, int(x // cell), int(y // cell), min_dist):
+                add(x, y)
+                active.append((x, y))
+                break
+        else:
+            active[idx] = active[-1]
+            active.pop()
+    return points
+
+
+def jittered_grid(n: int, width: int, height: int, avoid=(), rng=random,
+                  button_size=BUTTON_SIZE, gap: int = 4):
+    """
+    n button centers on a jittered grid, for layouts too dense for Poisson-disk sampling.
+    The grid shape with the most slack between cells is chosen; each center moves randomly
+    within its cell by at most the slack, so buttons in different columns (or rows) can never
+    overlap. Cells that jitter could carry into an avoid circle are left empty.
+    Raises ValueError if the canvas cannot hold n buttons at all.
+    """
+    bw, bh = button_size[0] + gap, button_size[1] + gap
+    lo_x, lo_y = bw / 2, bh / 2
+    inner_w, inner_h = width - bw, height - bh
+    best = None
+    for cols in range(1, int(inner_w // bw) + 2):
+        sx = inner_w / cols
+        if sx < bw and cols > 1:
+            break
+        rows = max(1, int(inner_h // bh) + 1)
+        sy = inner_h / rows
+        while rows > 1 and sy < bh:
+            rows -= 1
+            sy = inner_h / rows
+        cells = [(lo_x + (c + 0.5) * sx, lo_y + (r + 0.5) * sy) for c in range(cols) for r in range(rows)]
+        # a jittered center stays within this distance of its cell center
+        reach = math.hypot(max(0, sx - bw), max(0, sy - bh)) / 2 + 1
+        cells = [(x, y) for x, y in cells if _outside(x, y, [(ax, ay, r + reach) for ax, ay, r in avoid])]
+        slack = min(sx - bw, sy - bh)
+        if len(cells) >= n and slack >= 0 and (best is None or slack > best[0]):
+            best = (slack, sx, sy, cells)
+    if best is None:
+        raise ValueError(f"a {width}x{height} canvas cannot hold {n} buttons of {button_size[0]}x{button_size[1]}")
+    _, sx, sy, cells = best
+    jx, jy = (sx - bw) / 2, (sy - bh) / 2
+    return [(round(x + rng.uniform(-jx, jx)), round(y + rng.uniform(-jy, jy))) for x, y in rng.sample(cells, n)]
+
+
+def sample_positions(n: int, width: int, height: int, min_dist: float | None = None,
+                     margin: float | None = None, avoid=(), rng=random, k: int = 30):
+    """
+    Place n points at least min_dist apart inside [margin, width - margin] x [margin, height - margin]
+    with Bridson's Poisson-disk sampler and keep a random n of them. margin defaults to min_dist.
+    If the canvas is too crowded for n points that far apart, falls back to jittered_grid, which
+    only guarantees that buttons don't overlap.
+    avoid: (x, y, radius) circles no point may fall inside, e.g. the cursor.
+    rng: random.Random or the `random` module itself (the default), so random.seed() applies.
+    """
+    if n == 0:
+        return []
+    if min_dist is None:
+        min_dist = default_min_dist(n, width, height)
+    if margin is None:
+        margin = min_dist
+    if margin <= width - margin and margin <= height - margin:
+        points = _bridson(width, height, min_dist, margin, avoid, rng, k)
+        if len(points) >= n:
+            return rng.sample(points, n)
+    return jittered_grid(n, width, height, avoid, rng)
+
+
+class GridIndex:
+    """
+    Uniform-grid spatial index over axis-aligned boxes for hit-testing.
+    Each box is registered in every cell it touches; queries only look at the cells the
+    query box touches and return matches in insertion order.
+    """
+
+    def __init__(self, cell: int = 64):
+        self.cell = cell
+        self.cells = defaultdict(list)
+        self.boxes = []
+        self.values = []
+
+    def _cells(self, bbox):
+        x1, y1, x2, y2 = bbox
+        c = self.cell
+        for i in range(int(x1 // c), int(x2 // c) + 1):
+            for j in range(int(y1 // c), int(y2 // c) + 1):
+                yield i, j
+
+    def insert(self, bbox, value):
+        idx = len(self.boxes)
+        self.boxes.append(tuple(bbox))
+        self.values.append(value)
+        for key in self._cells(bbox):
+            self.cells[key].append(idx)
+
+    def query(self, bbox) -> list:
+        """Values whose box overlaps bbox (strict overlap, touching edges do not count)."""
+        x1, y1, x2, y2 = bbox
+        found = set()
+        for key in self._cells(bbox):
+            for idx in self.cells.get(key, ()):
+                bx1, by1, bx2, by2 = self.boxes[idx]
+                if x1 < bx2 and x2 > bx1 and y1 < by2 and y2 > by1:
+                    found.add(idx)
+        return [self.values[idx] for idx in sorted(found)]
+
+    def hit(self, bbox):
+        """First inserted value overlapping bbox, or None."""
+        hits = self.query(bbox)
+        return hits[0] if hits else None
+
+    def __len__(self):
+        return len(self.boxes)
@@ -0,0 +1,143 @@
+import re
+import numpy as np
+from PIL import Image
+from scipy import ndimage
+
+# RGB values each color name can render as. Tk resolves names through the X11 color table and
+# PIL through the CSS one, and the two disagree for green and purple, so both are accepted.
+PALETTE = {
+    "green": [(0, 255, 0), (0, 128, 0)],
+    "red": [(255, 0, 0)],
+    "orange": [(255, 165, 0)],
+    "blue": [(0, 0, 255)],
+    "purple": [(160, 32, 240), (128, 0, 128)],
+}
+CURSOR_RGB = (0, 0, 0)
+
+
+def parse_target_color(instruction: str, colors=PALETTE) -> str | None:
+    """
+    Return the first known color name mentioned in the instruction, e.g. "click red" -> "red".
+    """
+    for word in re.findall(r"[a-z]+", instruction.lower()):
+        if word in colors:
+            return word
+    return None
+
+
+class ColorLocator:
+    """
+    Deterministic locator for the synthetic desktop: flat-colored buttons and a black square
+    cursor on a white background. Finds both by color thresholding plus connected components,
+    no neural net involved.
+    """
+
+    def __init__(self, tolerance: int = 40, cursor_size: int = 12, min_button_area: int = 200,
+                 palette=PALETTE, open_mask: bool = True):
+        """
+        open_mask: apply a 3x3 opening then closing before labeling. The opening erases 1px features
+        (grid lines drawn for Gemini, button outlines, text strokes), the closing heals 1px gaps those
+        lines cut through blobs, and neither moves the edges of solid rectangles.
+        """
+        self.tolerance = tolerance
+        self.open_mask = open_mask
+        self.cursor_size = cursor_size
+        self.min_button_area = min_button_area
+        self.palette = palette
+
+    def load(self, image) -> np.ndarray:
+        """
+        Accepts a path, a PIL image or an (H, W, 3) array and returns an int16 RGB array.
+        """
+        if isinstance(image, np.ndarray):
+            if image.dtype == np.int16 and image.shape[-1] == 3:
+                return image
+            frame = image
+        else:
+            if isinstance(image, str):
+                image = Image.open(image)
+            frame = np.asarray(image.convert("RGB"))
+        return frame[..., :3].astype(np.int16)
+
+    def mask(self, frame: np.ndarray, rgbs) -> np.ndarray:
+        """
+        Boolean mask of pixels within tolerance (per channel) of any of the given RGB values.
+        """
+        out = np.zeros(frame.shape[:2], dtype=bool)
+        for rgb in rgbs:
+            out |= (np.abs(frame - np.asarray(rgb, dtype=np.int16)) <= self.tolerance).all(axis=-1)
+        if self.open_mask:
+            square = np.ones((3, 3), dtype=bool)
+            out = ndimage.binary_closing(ndimage.binary_opening(out, structure=square), structure=square)
+        return out
+
+    @staticmethod
+    def _components(mask: np.ndarray):
+        """
+        Yields (area, (y0, y1, x0, x1)) for each 4-connected component of the mask.
+        """
+        labels, count = ndimage.label(mask)
+        if count == 0:
+            return
+        areas = np.bincount(labels.ravel(), minlength=count + 1)
+        for i, sl in enumerate(ndimage.find_objects(labels), start=1):
+            if sl is None:
+                continue
+            ys, xs = sl
+            yield int(areas[i]), (ys.start, ys.stop, xs.start, xs.stop)
+
+    def find_cursor(self, image):
+        """
+        Returns the cursor center (x, y), or None if no cursor-shaped black blob is visible.
+        Text and button outlines are also black, so a component only counts if its bounding
+        box is about cursor_size square and mostly filled.
+        """
+        frame = self.load(image)
+        best = None
+        for area, (y0, y1, x0, x1) in self._components(self.mask(frame, [CURSOR_RGB])):
+            bw, bh = x1 - x0, y1 - y0
+            if abs(bw - self.cursor_size) > 3 or abs(bh - self.cursor_size) > 3:
+                continue
+            fill = area / (bw * bh)
+            if fill < 0.8:
+                continue
+            if best is None or fill > best[0]:
+                best = (fill, ((x0 + x1) / 2, (y0 + y1) / 2))
+        return best[1] if best else None
+
+    def find_button(self, image, color: str):
+        """
+        Returns (center_x, center_y, width, height) of the largest blob of the given color,
+        or None if the color is unknown or not on screen.
+        """
+        if color not in self.palette:
+            return None
+        frame = self.load(image)
+        best = None
+        for area, (y0, y1, x0, x1) in self._components(self.mask(frame, self.palette[color])):
+            if area < self.min_button_area:
+                continue
+            if best is None or area > best[0]:
+                best = (area, ((x0 + x1) / 2, (y0 + y1) / 2, x1 - x0, y1 - y0))
+        return best[1] if best else None
+
+    def find_all(self, image) -> dict:
+        """
+        Returns {"cursor": (x, y) | None, <color>: (x, y, w, h) | None, ...} for every palette color.
+        """
+        frame = self.load(image)
+        found = {"cursor": self.find_cursor(frame)}
+        for color in self.palette:
+            found[color] = self.find_button(frame, color)
+        return found
+
+    def locate(self, image, color: str):
+        """
+        Returns the exact (dx, dy) from the cursor to the center of the named button, or None.
+        """
+        frame = self.load(image)
+        cursor = self.find_cursor(frame)
+        button = self.find_button(frame, color)
+        if cursor is None or button is None:
+            return None
+        return button[0] - cursor[0], button[1] - cursor[1]
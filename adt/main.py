@@ -1,10 +1,52 @@
+import argparse
 import time
 
 from adt.agent_func import Agent
+from adt.executor import RequestExecutor
+from adt.fake_backend import FakeBackend
+from adt.metrics import MetricsDumper, serve_metrics
 from adt.vdesktop import VDesktop
 
 
-agent = Agent()
-app = VDesktop(agent)
+parser = argparse.ArgumentParser(description="Run VDesktop")
+parser.add_argument("--render", type=str, default="mss", choices=["mss", "scene"],
+                    help="How agent screenshots are taken: screen grab (mss) or rendered from the scene graph")
+parser.add_argument("--observation", type=str, default="image", choices=["image", "text", "text+image"],
+                    help="What Gemini is shown: gridded screenshot, JSON scene layout, or layout plus a downscaled screenshot")
+parser.add_argument("--protocol", type=str, default="moves", choices=["moves", "point"],
+                    help="How Gemini answers: a list of 10px moves, or JSON target coordinates compiled locally")
+parser.add_argument("--predictor", type=str, default="local", choices=["local", "server"],
+                    help="Run ImageShot in-process or use a shared model.server instance")
+parser.add_argument("--server-socket", type=str, default=None, help="Socket of the inference server")
+parser.add_argument("--deadline", type=float, default=30.0, help="Seconds a Gemini call may take before falling back to ImageShot")
+parser.add_argument("--rate", type=float, default=None, help="Max Gemini calls per second")
+parser.add_argument("--hedge", action="store_true", help="Send a duplicate Gemini request when one is slower than the recent p95")
+parser.add_argument("--fake-backend", action="store_true", help="Answer Gemini calls with the offline FakeBackend")
+parser.add_argument("--width", type=int, default=600, help="Canvas width")
+parser.add_argument("--height", type=int, default=350, help="Canvas height")
+parser.add_argument("--buttons", type=int, default=5, help="Number of buttons on the canvas")
+parser.add_argument("--hud", action="store_true", help="Show a metrics overlay on the canvas (F1 toggles)")
+parser.add_argument("--metrics-file", type=str, default=None, help="Periodically dump metrics in Prometheus text format to this file")
+parser.add_argument("--metrics-port", type=int, default=None, help="Serve metrics on http://127.0.0.1:PORT/metrics")
+parser.add_argument("--profile-dir", type=str, default=None, help="Write a sampling profile of every agent command here (F2 toggles)")
+parser.add_argument("--distill-dir", type=str, default=None, help="Collect successful Gemini commands into a training shard here")
+parser.add_argument("--trace", type=str, default=None, help="Record every agent command to this trace file")
+args = parser.parse_args()
 
-app.mainloop()
\ No newline at end of file
+executor = RequestExecutor(deadline=args.deadline, rate=args.rate, hedge=args.hedge)
+agent = Agent(observation=args.observation, protocol=args.protocol, predictor=args.predictor, server_socket=args.server_socket,
+              executor=executor, backend=FakeBackend() if args.fake_backend else None)
+app = VDesktop(agent, render=args.render, trace_path=args.trace,
+               width=args.width, height=args.height, num_buttons=args.buttons,
+               hud=args.hud, profile_dir=args.profile_dir, distill_dir=args.distill_dir)
+
+dumper = MetricsDumper(args.metrics_file).start() if args.metrics_file else None
+if args.metrics_port:
+    serve_metrics(args.metrics_port)
+
+try:
+    app.mainloop()
+finally:
+    agent.close()
+    if dumper is not None:
+        dumper.stop()
@@ -0,0 +1,64 @@
+from functools import lru_cache
+
+# Prompts are split into a static system instruction, identical across calls for a given
+# configuration and therefore cacheable server-side, and a short per-call suffix.
+
+
+class PromptTemplate:
+    def __init__(self, system: str, suffix: str):
+        self.system = system
+        self.suffix = suffix
+
+    def render(self, **fields) -> str:
+        """Per-call part of the prompt."""
+        return self.suffix.format(**fields)
+
+
+@lru_cache(maxsize=None)
+def grid_template(arrsize: int) -> PromptTemplate:
+    system = f"""You are a model specializing in GUI work. Each request attaches an image and an instruction. The image has a grid of redlines of it, each symbolizing {arrsize} pixels. The cursor is that of a black square. Your two actions are as follows:
+1. Click the screen.
+2. Move the cursor by 10px (1/{arrsize/10} red grid units) up/down/left/right.
+
+Output a specific list of actions of [click] or [move left/down/up/right amount], or state NA if not possible. An example output may be Response: [move right 1, move left 20, click]. Only include the list of actions and nothing else."""
+    return PromptTemplate(system, "Here is your goal: {cmd}\nNow go.")
+
+
+@lru_cache(maxsize=None)
+def layout_template() -> PromptTemplate:
+    system = """You are a model specializing in GUI work. Each request describes the screen by a JSON layout, in pixels (x grows right, y grows down; boxes are [x1, y1, x2, y2]), and gives an instruction. The cursor is a small black square centered at "cursor". A downscaled screenshot may be attached as well. Your two actions are as follows:
+1. Click the screen.
+2. Move the cursor by 10px up/down/left/right.
+
+Output a specific list of actions of [click] or [move left/down/up/right amount], where amount is the number of 10px steps, or state NA if not possible. An example output may be Response: [move right 1, move left 20, click]. Only include the list of actions and nothing else."""
+    return PromptTemplate(system, "Layout: {layout}\nHere is your goal: {cmd}\nNow go.")
+
+
+@lru_cache(maxsize=None)
+def consult_template(arrsize: int) -> PromptTemplate:
+    system = f"You are a model specializing in GUI work. Each request attaches an image and an instruction. The image has a grid of red lines of it, each symbolizing {arrsize}  pixels. The cursor is that of a black square. For the instruction, answer: How much red squares do you think you need to move the cursor to complete the instruction? Now let's say you can only move 10px. How many of those 10px moves do you need?"
+    return PromptTemplate(system, "Here is the instruction: {cmd}.")
+
+
+# Point protocol: the model names the target position and the cursor plan is compiled locally.
+POINT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "found": {"type": "boolean"},
+        "x": {"type": "integer"},
+        "y": {"type": "integer"},
+    },
+    "required": ["found", "x", "y"],
+}
+
+
+@lru_cache(maxsize=None)
+def point_grid_template(arrsize: int) -> PromptTemplate:
+    system = f"""You are a model specializing in GUI work. Each request attaches an image and an instruction. The image has a grid of red lines on it, one every {arrsize} pixels, starting at the top-left corner (x grows right, y grows down). Find the center of the element the instruction refers to and answer with its pixel coordinates in the image as JSON: {{"found": true, "x": <int>, "y": <int>}}. If there is no such element, answer {{"found": false, "x": 0, "y": 0}}."""
+    return PromptTemplate(system, "Here is your goal: {cmd}")
+
+
+@lru_cache(maxsize=None)
+def point_layout_template() -> PromptTemplate:
+    system = """You are a model specializing in GUI work. Each request describes the screen by a JSON layout, in pixels (x grows right, y grows down; boxes are [x1, y1, x2, y2]), and gives an instruction. A downscaled screenshot may be attached as well. Find the center of the element the instruction refers to and answer with its layout coordinates as JSON: {"found": true, "x": <int>, "y": <int>}. If there is no such element, answer {"found": false, "x": 0, "y": 0}."""
+    return PromptTemplate(system, "Layout: {layout}\nHere is your goal: {cmd}")
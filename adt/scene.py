@@ -0,0 +1,241 @@
+import os
+import json
+from dataclasses import dataclass, field, asdict
+from PIL import Image, ImageColor, ImageDraw
+
+from adt.layout import GridIndex
+
+# Tk resolves color names through the X11 table, which differs from PIL's CSS table for some
+# names. These are the X11 values for the colors VDesktop uses, so rendering without a display
+# still matches what Tk would draw.
+X11_COLORS = {
+    "white": (255, 255, 255),
+    "black": (0, 0, 0),
+    "green": (0, 255, 0),
+    "red": (255, 0, 0),
+    "orange": (255, 165, 0),
+    "blue": (0, 0, 255),
+    "purple": (160, 32, 240),
+    "gray": (190, 190, 190),
+    "grey": (190, 190, 190),
+}
+TK_DEFAULT_BG = (217, 217, 217)  # #d9d9d9
+
+
+def x11_rgb(color: str) -> tuple:
+    if color.lower() in X11_COLORS:
+        return X11_COLORS[color.lower()]
+    return ImageColor.getrgb(color)[:3]
+
+
+def _shadows(rgb):
+    """
+    Light and dark shades Tk uses for 3D borders (mirrors TkpGetShadows on Unix).
+    """
+    r, g, b = rgb
+    if r * 0.5 * r + g * 1.0 * g + b * 0.28 * b < 255 * 0.05 * 255:
+        # very dark backgrounds get lighter shadows instead of darker ones
+        dark = tuple((255 + 3 * c) // 4 for c in rgb)
+        light = tuple((255 + c) // 2 for c in dark)
+        return light, dark
+    dark = tuple(60 * c // 100 for c in rgb)
+    light = tuple(max(min(255, 14 * c // 10), (255 + c) // 2) for c in rgb)
+    return light, dark
+
+
+@dataclass
+class Button:
+    color: str
+    x: float  # center
+    y: float
+    w: int = 40
+    h: int = 30
+    bd: int = 2  # raised relief border width
+
+    @property
+    def bbox(self):
+        x1 = int(self.x - self.w / 2)
+        y1 = int(self.y - self.h / 2)
+        return x1, y1, x1 + self.w, y1 + self.h
+
+
+@dataclass
+class Marker:
+    x: float
+    y: float
+    color: str
+    label: str = ""
+
+
+@dataclass
+class Scene:
+    """
+    Everything needed to draw the VDesktop canvas: size, buttons, cursor and debug markers.
+    Coordinates are canvas coordinates, as used by VDesktop.canvas.
+    """
+    width: int = 600
+    height: int = 350
+    buttons: list[Button] = field(default_factory=list)
+    cursor: tuple = (300, 175)  # center
+    cursor_size: int = 12
+    markers: list[Marker] = field(default_factory=list)
+    background: str = "white"
+    highlight: int = 0  # Tk canvas highlightthickness
+    highlight_color: tuple = TK_DEFAULT_BG
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def to_layout(self) -> str:
+        """
+        Compact JSON description of what an agent needs: canvas size, cursor center and
+        each button's color and box as [x1, y1, x2, y2] in pixels. Debug markers are left out.
+        """
+        layout = {
+            "canvas": [self.width, self.height],
+            "cursor": [round(self.cursor[0]), round(self.cursor[1])],
+            "buttons": [{"color": b.color, "box": list(b.bbox)} for b in self.buttons],
+        }
+        return json.dumps(layout, separators=(",", ":"))
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Scene":
+        d = dict(d)
+        d["buttons"] = [Button(**b) for b in d.get("buttons", [])]
+        d["markers"] = [Marker(**m) for m in d.get("markers", [])]
+        d["cursor"] = tuple(d.get("cursor", (300, 175)))
+        d["highlight_color"] = tuple(d.get("highlight_color", TK_DEFAULT_BG))
+        return cls(**d)
+
+
+def button_index(buttons: list[Button]) -> GridIndex:
+    """Spatial index of button boxes, valued by color, for click hit-testing."""
+    index = GridIndex()
+    for b in buttons:
+        index.insert(b.bbox, b.color)
+    return index
+
+
+def simulate_actions(scene: Scene, actions: list[str]):
+    """
+    Apply an action list to the scene the way VDesktop.execute would, without Tk.
+    Moves are 10px steps with the cursor box clamped to the canvas; a click hits the first
+    button whose box overlaps the cursor box.
+    Returns (final cursor center, list of click results: color or None per click).
+    """
+    cx, cy = scene.cursor
+    half = scene.cursor_size // 2
+    clicks = []
+    index = None
+    for action in actions:
+        parts = action.split()
+        if not parts:
+            continue
+        if parts[0] == "move" and len(parts) > 1:
+            try:
+                times = int(parts[2]) if len(parts) > 2 else 1
+            except ValueError:
+                continue
+            step = 10 * times
+            if parts[1] == "left": cx -= step
+            elif parts[1] == "right": cx += step
+            elif parts[1] == "up": cy -= step
+            elif parts[1] == "down": cy += step
+            cx = min(max(cx, half), scene.width - half)
+            cy = min(max(cy, half), scene.height - half)
+        elif parts[0] == "click":
+            if index is None:
+                index = button_index(scene.buttons)
+            clicks.append(index.hit((cx - half, cy - half, cx + half, cy + half)))
+    return (cx, cy), clicks
+
+
+def _draw_raised(draw: ImageDraw.ImageDraw, bbox, rgb, bd: int):
+    x1, y1, x2, y2 = bbox  # x2/y2 exclusive
+    light, dark = _shadows(rgb)
+    draw.rectangle([x1, y1, x2 - 1, y2 - 1], fill=dark)
+    # top and left edges are lit, bevelled at the top-right and bottom-left corners
+    draw.polygon([(x1, y1), (x2 - 1, y1), (x2 - bd, y1 + bd - 1), (x1 + bd - 1, y1 + bd - 1),
+                  (x1 + bd - 1, y2 - bd), (x1, y2 - 1)], fill=light)
+    draw.rectangle([x1 + bd, y1 + bd, x2 - bd - 1, y2 - bd - 1], fill=rgb)
+
+
+def render_scene(scene: Scene, resolve=x11_rgb) -> Image.Image:
+    """
+    Rasterize the scene into an RGB image of the canvas widget (including its highlight ring),
+    pixel-compatible with an mss grab of the same region up to the relief corner pixels and
+    marker label glyphs. Needs no display: pass Tk's winfo_rgb-based resolver when one is
+    available, otherwise X11 color values are used.
+    """
+    hl = scene.highlight
+    img = Image.new("RGB", (scene.width + 2 * hl, scene.height + 2 * hl), resolve(scene.background))
+    draw = ImageDraw.Draw(img)
+
+    # Tk places canvas coordinate (0, 0) at the widget corner, underneath the highlight ring
+    for b in scene.buttons:
+        rgb = resolve(b.color)
+        if b.bd > 0:
+            _draw_raised(draw, b.bbox, rgb, b.bd)
+        else:
+            x1, y1, x2, y2 = b.bbox
+            draw.rectangle([x1, y1, x2 - 1, y2 - 1], fill=rgb)
+
+    for m in scene.markers:
+        rgb = resolve(m.color)
+        r = 5
+        draw.ellipse([m.x - r, m.y - r, m.x + r, m.y + r], fill=rgb, outline=(255, 255, 255), width=2)
+        if m.label:
+            draw.text((m.x, m.y - 15), m.label, fill=rgb, anchor="mm")
+
+    half = scene.cursor_size // 2
+    cx, cy = int(scene.cursor[0]), int(scene.cursor[1])
+    draw.rectangle([cx - half, cy - half, cx - half + scene.cursor_size - 1, cy - half + scene.cursor_size - 1],
+                   fill=resolve("black"))
+
+    if hl > 0:
+        w, h = img.size
+        for i in range(hl):
+            draw.rectangle([i, i, w - 1 - i, h - 1 - i], outline=scene.highlight_color)
+    return img
+
+
+class SceneCapture:
+    """
+    Drop-in alternative to FrameCapture that renders frames from the scene graph instead of
+    grabbing the screen. Works without a visible window or display; `version` increases only
+    when the scene changes.
+    """
+
+    def __init__(self, resolve=x11_rgb):
+        self.resolve = resolve
+        self.scene = None
+        self.frame = None
+        self.version = 0
+        self._saved = {}
+
+    def mark_dirty(self, x1, y1, x2, y2):
+        # the whole scene is compared on every grab, so there is nothing to track
+        pass
+
+    def invalidate(self):
+        self.scene = None
+
+    def grab(self, scene: Scene) -> Image.Image:
+        if self.frame is None or scene != self.scene:
+            self.frame = render_scene(scene, self.resolve)
+            self.scene = scene
+            self.version += 1
+        return self.frame
+
+    def save(self, path: str) -> bool:
+        if self.frame is None:
+            return False
+        if self._saved.get(path) == self.version and os.path.exists(path):
+            return False
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.frame.save(path)
+        self._saved[path] = self.version
+        return True
+
+    def close(self):
+        pass
@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+import struct
+import tempfile
+import time
+import zlib
+
+import numpy as np
+from PIL import Image
+
+from adt.scene import Scene, simulate_actions
+from adt.utility import parse_moves
+
+MAGIC = b"ADTTRACE"
+VERSION = 1
+_HEADER = struct.Struct("<8sH")
+_LENGTHS = struct.Struct("<II")
+
+
+class TraceRecorder:
+    """
+    Appends one entry per agent command to a compact binary trace.
+
+    File layout: MAGIC, u16 version, then per entry u32 metadata length, u32 frame length,
+    UTF-8 JSON metadata, zlib-compressed frame bytes. A frame is stored either whole (key) or
+    XORed with the previous frame (delta); consecutive desktop frames differ in a few small
+    regions, so the XOR is almost all zeros and compresses to a few hundred bytes.
+    """
+
+    def __init__(self, path: str, keyframe_interval: int = 50, level: int = 6):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "ab")
+        if new:
+            self.file.write(_HEADER.pack(MAGIC, VERSION))
+        self.keyframe_interval = keyframe_interval
+        self.level = level
+        self.prev = None
+        self.count = 0
+
+    def record(self, frame, meta: dict):
+        """
+        frame: PIL image or (H, W, 3) uint8 array. meta: JSON-serializable entry fields
+        (instruction, raw_response, actions, timings, state before/after, ...).
+        """
+        if isinstance(frame, Image.Image):
+            frame = np.asarray(frame.convert("RGB"))
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+
+        key = (self.prev is None or self.prev.shape != frame.shape
+               or self.count % self.keyframe_interval == 0)
+        payload = frame if key else np.bitwise_xor(frame, self.prev)
+        data = zlib.compress(payload.tobytes(), self.level)
+
+        meta = dict(meta, frame_kind="key" if key else "delta", frame_shape=list(frame.shape))
+        meta_bytes = json.dumps(meta, separators=(",", ":")).encode()
+        self.file.write(_LENGTHS.pack(len(meta_bytes), len(data)))
+        self.file.write(meta_bytes)
+        self.file.write(data)
+        self.file.flush()
+
+        self.prev = frame
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_trace(path: str):
+    """
+    Yields (meta, frame) for each entry, reconstructing delta frames as it goes.
+    """
+    with open(path, "rb") as f:
+        magic, version = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an ADT trace")
+        if version > VERSION:
+            raise ValueError(f"{path} uses trace version {version}, this reader supports {VERSION}")
+        prev = None
+        while True:
+            head = f.read(_LENGTHS.size)
+            if len(head) < _LENGTHS.size:
+                return
+            meta_len, data_len = _LENGTHS.unpack(head)
+            meta = json.loads(f.read(meta_len))
+            shape = tuple(meta["frame_shape"])
+            payload = np.frombuffer(zlib.decompress(f.read(data_len)), dtype=np.uint8).reshape(shape)
+            frame = payload if meta["frame_kind"] == "key" else np.bitwise_xor(payload, prev)
+            prev = frame
+            yield meta, frame
+
+
+def _point_parser():
+    """Compiles point-protocol answers like the agent that recorded them, one Agent per observation."""
+    from adt.agent_func import Agent
+    agents = {}
+
+    def parse(raw_response, img_path, scene=None, observation="image"):
+        if observation not in agents:
+            agents[observation] = Agent(observation=observation, protocol="point")
+        return agents[observation]._point_to_actions(raw_response, img_path, scene)[0]
+    return parse
+
+
+def replay(path: str, agent_func=None, parser=parse_moves, point_parser=None, verbose: bool = True) -> dict:
+    """
+    Re-run every entry of a trace offline.
+
+    agent_func(instruction, img_path, scene=None) -> actions: a new agent backend to evaluate on the
+        recorded frames. When None, the recorded raw responses are re-parsed with `parser` instead
+        (entries without a raw response keep their recorded actions).
+    point_parser(raw_response, img_path, scene, observation) -> actions: used instead of `parser` for
+        entries recorded with the point protocol; defaults to Agent._point_to_actions.
+    Outcomes are simulated against the recorded scene, so no display or network is needed.
+    Returns counts of entries replayed, actions/outcomes that changed, and clicks that hit the
+    target named in the instruction before and after.
+    """
+    summary = {"entries": 0, "actions_changed": 0, "outcome_changed": 0,
+               "hits_recorded": 0, "hits_replayed": 0, "seconds": 0.0}
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        img_path = os.path.join(tmp, "frame.png")
+        for i, (meta, frame) in enumerate(read_trace(path)):
+            scene = Scene.from_dict(meta["scene"]) if meta.get("scene") else None
+            if agent_func is not None:
+                Image.fromarray(frame).save(img_path)
+                actions = agent_func(meta["instruction"], img_path, scene=scene)
+            elif meta.get("raw_response") is not None and meta.get("protocol") == "point":
+                if point_parser is None:
+                    point_parser = _point_parser()
+                # the cursor is located on the frame, as when the answer was first compiled
+                Image.fromarray(frame).save(img_path)
+                actions = point_parser(meta["raw_response"], img_path, scene, meta.get("observation", "image"))
+            elif meta.get("raw_response") is not None:
+                actions = parser(meta["raw_response"])
+            else:
+                actions = meta["actions"]
+
+            recorded_clicks = meta.get("after", {}).get("clicks", [])
+            clicks = simulate_actions(scene, actions)[1] if scene is not None else None
+            target = meta.get("target")
+
+            summary["entries"] += 1
+            summary["actions_changed"] += actions != meta["actions"]
+            summary["outcome_changed"] += clicks is not None and clicks != recorded_clicks
+            summary["hits_recorded"] += target is not None and target in recorded_clicks
+            summary["hits_replayed"] += target is not None and clicks is not None and target in clicks
+            if verbose and actions != meta["actions"]:
+                print(f"[{i}] {meta['instruction']!r}: {meta['actions']} -> {actions} "
+                      f"(clicks {recorded_clicks} -> {clicks})")
+    summary["seconds"] = time.perf_counter() - start
+    return summary
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Inspect or replay VDesktop session traces")
+    ap.add_argument("command", choices=["show", "replay"])
+    ap.add_argument("trace", type=str, help="Trace file written by VDesktop(trace_path=...)")
+    ap.add_argument("--mode", type=str, default=None, help="Agent mode to replay with (Gemini, ImageShot, Hybrid, Routed, Locator); default re-parses recorded responses")
+    ap.add_argument("--observation", type=str, default="image", choices=["image", "text", "text+image"])
+    ap.add_argument("--protocol", type=str, default="moves", choices=["moves", "point"], help="How Gemini answers when replaying with --mode")
+    ap.add_argument("--fake-backend", action="store_true", help="Serve Gemini calls from the offline FakeBackend")
+    args = ap.parse_args()
+
+    if args.command == "show":
+        size = os.path.getsize(args.trace)
+        n = 0
+        for meta, frame in read_trace(args.trace):
+            n += 1
+            print(f"[{n - 1}] {meta['frame_kind']:<5} {meta['instruction']!r} mode={meta.get('mode')} "
+                  f"actions={meta['actions']} clicks={meta.get('after', {}).get('clicks')}")
+        print(f"{n} entries, {size / 1024:.1f} KiB ({size / max(n, 1) / 1024:.1f} KiB/entry)")
+    else:
+        agent_func = None
+        if args.mode:
+            from adt.agent_func import Agent
+            backend = None
+            if args.fake_backend:
+                from adt.fake_backend import FakeBackend
+                backend = FakeBackend(time_scale=0.0)
+            agent = Agent(observation=args.observation, protocol=args.protocol, backend=backend)
+
+            def agent_func(instruction, img_path, scene=None):
+                actions, _ = agent.ask(instruction, img_path, mode=args.mode, scene=scene)
+                return actions
+
+        summary = replay(args.trace, agent_func)
+        print(f"Replayed {summary['entries']} entries in {summary['seconds']:.2f}s: "
+              f"{summary['actions_changed']} action lists changed, {summary['outcome_changed']} outcomes changed, "
+              f"target hits {summary['hits_recorded']} -> {summary['hits_replayed']}")
@@ -21,10 +21,13 @@ def get_api_key() -> str:
     return key
 
 def draw_grid(input_path: str,
-              output_path: str,
+              output_path: str | None,
               arrsize: int = 100,
               line_color: str = "red",
               line_width: int = 1):
+    """
+    Draws the grid on a copy of the image and returns it; also saves it when output_path is given.
+    """
     img = Image.open(input_path)
     w, h = img.size
 
@@ -34,7 +37,9 @@ def draw_grid(input_path: str,
     for y in range(0, h, arrsize):
         draw.line([(0, y), (w, y)], fill=line_color, width=line_width)
 
-    img.save(output_path)
+    if output_path is not None:
+        img.save(output_path)
+    return img
 
 def parse_moves(response_text: str) -> list[str]:
     # find the bracketed part
@@ -45,3 +50,21 @@ def parse_moves(response_text: str) -> list[str]:
     # split on commas or newlines, strip whitespace, drop empty strings
     parts = re.split(r'[,\n]+', inside)
     return [p.strip() for p in parts if p.strip()]
+
+def actions_to_dxdy(actions: list[str]) -> tuple[int, int]:
+    """Net cursor displacement in pixels of a list of 10px move actions; clicks don't move."""
+    dx, dy = 0, 0
+    for action in actions:
+        parts = action.split()
+        if parts[0] == "move":
+            direction = parts[1]
+            try:
+                amount = int(parts[2])
+            except (IndexError, ValueError):
+                amount = 1
+            step = 10 * amount
+            if direction == "left": dx -= step
+            elif direction == "right": dx += step
+            elif direction == "up": dy -= step
+            elif direction == "down": dy += step
+    return dx, dy
@@ -1,40 +1,81 @@
 import tkinter as tk
-import random
-import math
-import mss
-import mss.tools
+import time
+from adt.capture import FrameCapture
+from adt.layout import button_colors, sample_positions
+from adt.scene import Scene, Button, Marker, SceneCapture, button_index
+from adt.locator import parse_target_color
+from adt.metrics import REGISTRY, SamplingProfiler
+from adt.trace import TraceRecorder
 
 class VDesktop(tk.Tk):
-    def __init__(self, agent):
+    TICK_MS = 50  # event loop probe period for frame time
+    HUD_EVERY = 10  # refresh the HUD every this many ticks
+    def __init__(self, agent, render="mss", trace_path=None, width=600, height=350, num_buttons=5,
+                 metrics=REGISTRY, hud=False, profile_dir=None, distill_dir=None):
+        """
+        render: "mss" grabs the window from the screen, "scene" rasterizes the canvas
+        from the scene graph (no control bar, works when the window is hidden or occluded).
+        trace_path: if set, every agent command is appended to this trace (see adt.trace).
+        width, height, num_buttons: canvas size and number of buttons; colors repeat past five.
+        metrics: adt.metrics.Registry the desktop reports timings and click counts to.
+        hud: show a metrics overlay in the canvas corner (hidden while screenshots are taken). F1 toggles it.
+        profile_dir: if set, each agent command is run under a sampling profiler and its collapsed
+            stacks are written here. F2 toggles profiling.
+        distill_dir: if set, Gemini-answered commands that click their target are added to a
+            training shard here (see model.distill).
+        """
         super().__init__()
         self.title("vdesktop")
-        self.geometry("600x400")
+        self.geometry(f"{width}x{height + 50}")
         self.resizable(False, False)
 
         # keep reference to agent
         self.agent = agent
 
+        # persistent screen capture, re-grabs only regions marked dirty
+        self.render = render
+        if render == "scene":
+            self.capture = SceneCapture(resolve=self._rgb)
+        else:
+            self.capture = FrameCapture()
+        self.debug_markers = []
+        self.trace = TraceRecorder(trace_path) if trace_path else None
+        self.distill = None
+        if distill_dir:
+            from model.distill import DistillShard
+            self.distill = DistillShard(distill_dir)
+
+        self.metrics = metrics
+        self.m_capture = metrics.histogram("adt_capture_seconds", "Screenshot capture time")
+        self.m_agent = metrics.histogram("adt_agent_seconds", "Agent.ask latency by mode")
+        self.m_execute = metrics.histogram("adt_execute_seconds", "Time to execute an action list")
+        self.m_frame = metrics.histogram("adt_tk_frame_seconds", "Interval between Tk event loop ticks")
+        self.m_clicks = metrics.counter("adt_clicks_total", "Clicks by result (hit: landed on a button)")
+        self.m_commands = metrics.counter("adt_commands_total", "Agent commands by mode and whether the target was clicked")
+        self.profile_dir = profile_dir
+        self.profiling = profile_dir is not None
+        self.command_count = 0
+
         # Canvas area
-        self.canvas_width = 600
-        self.canvas_height = 350
+        self.canvas_width = width
+        self.canvas_height = height
         self.canvas = tk.Canvas(self, width=self.canvas_width, height=self.canvas_height, bg="white")
         self.canvas.pack()
 
-        # Randomly place 5 non-overlapping buttons and remember their window ids and colors
+        # Randomly place non-overlapping buttons and remember their window ids and colors
         self.button_data = []  # list of tuples: (window_id, color)
-        positions = []
-        min_dist = 80  # minimum separation between button centers
-        self.button_colors = ["green", "red", "orange", "blue", "purple"]
-        for color in self.button_colors:
-            while True:
-                x = random.randint(min_dist, self.canvas_width - min_dist)
-                y = random.randint(min_dist, self.canvas_height - min_dist)
-                if all(math.hypot(x - x2, y - y2) > min_dist for x2, y2 in positions):
-                    positions.append((x, y))
-                    break
+        self.button_colors = button_colors(num_buttons)
+        # keep buttons off the cursor's start position in the middle
+        positions = sample_positions(num_buttons, self.canvas_width, self.canvas_height,
+                                     avoid=[(self.canvas_width // 2, self.canvas_height // 2, 40)])
+        buttons = []
+        for color, (x, y) in zip(self.button_colors, positions):
             btn = tk.Frame(self.canvas, bg=color, width=40, height=30, bd=2, relief="raised")
             win_id = self.canvas.create_window(x, y, window=btn)
             self.button_data.append((win_id, color))
+            buttons.append(Button(color, x, y))
+        # buttons never move, so click hit-testing uses a grid index built once
+        self.hit_index = button_index(buttons)
 
         # Cursor as a small square widget, initially in the middle
         self.cursor_size = 12
@@ -56,6 +97,15 @@ class VDesktop(tk.Tk):
         # start with controls visible
         self.show_controls()
 
+        self.hud = self.canvas.create_text(4, 4, anchor="nw", text="", fill="gray25", font=("TkFixedFont", 8),
+                                           state="normal" if hud else "hidden", tags="hud")
+        self.bind("<F1>", lambda e: self.toggle_hud())
+        self.bind("<F2>", lambda e: self.toggle_profiling())
+        self.bind("<F5>", lambda e: self.reload_model())
+        self._last_tick = time.perf_counter()
+        self._ticks = 0
+        self.after(self.TICK_MS, self._tick)
+
     def _build_controls(self):
         cf = self.controls_frame
         # arrow and action buttons
@@ -78,7 +128,7 @@ class VDesktop(tk.Tk):
 
         # Mode selection
         self.mode_var = tk.StringVar(value="Gemini")
-        modes = ["Gemini", "ImageShot", "Hybrid"]
+        modes = ["Gemini", "ImageShot", "Hybrid", "Routed", "Locator"]
         mode_menu = tk.OptionMenu(iv, self.mode_var, *modes)
         mode_menu.pack(side="left", padx=5)
 
@@ -95,7 +145,95 @@ class VDesktop(tk.Tk):
         self.controls_frame.pack_forget()
         self.input_frame.pack(side="bottom", fill="x")
 
+    def _tick(self):
+        now = time.perf_counter()
+        self.m_frame.observe(now - self._last_tick)
+        self._last_tick = now
+        self._ticks += 1
+        if self._ticks % self.HUD_EVERY == 0 and self.canvas.itemcget(self.hud, "state") != "hidden":
+            self._update_hud()
+        self.after(self.TICK_MS, self._tick)
+
+    def _update_hud(self):
+        ms = lambda h, **labels: h.quantile(0.5, **labels) * 1000
+        hits, misses = self.m_clicks.get(result="hit"), self.m_clicks.get(result="miss")
+        lines = [f"frame p50 {ms(self.m_frame):.0f}ms p99 {self.m_frame.quantile(0.99) * 1000:.0f}ms",
+                 f"capture p50 {ms(self.m_capture, render=self.render):.0f}ms",
+                 f"execute p50 {ms(self.m_execute):.0f}ms"]
+        for key, _ in sorted(self.m_agent.series.items()):
+            mode = dict(key)["mode"]
+            lines.append(f"{mode} p50 {ms(self.m_agent, mode=mode):.0f}ms (n={self.m_agent.count(mode=mode)})")
+        lines.append(f"clicks {hits}/{hits + misses} hit" + (" | profiling" if self.profiling else ""))
+        self.canvas.itemconfigure(self.hud, text="\n".join(lines))
+        self.canvas.tag_raise(self.hud)
+        self._mark_dirty(self.canvas.bbox(self.hud))
+
+    def toggle_hud(self):
+        hidden = self.canvas.itemcget(self.hud, "state") == "hidden"
+        self.canvas.itemconfigure(self.hud, state="normal" if hidden else "hidden")
+        if hidden:
+            self._update_hud()
+
+    def toggle_profiling(self):
+        self.profiling = not self.profiling
+        if self.profiling and self.profile_dir is None:
+            self.profile_dir = "profiles"
+        print(f"Per-command profiling {'on, writing to ' + self.profile_dir if self.profiling else 'off'}")
+
+    def reload_model(self):
+        """Load a retrained ImageShot checkpoint without restarting (local predictor or inference server)."""
+        predictor = getattr(self.agent, "predictor", None)
+        if predictor is not None and hasattr(predictor, "reload"):
+            n = predictor.reload()
+        else:
+            from model.inference import REGISTRY
+            n = REGISTRY.reload()
+        print(f"Reloaded {n} model(s)" if n else "No changed checkpoints to reload")
+
+    def _rgb(self, color):
+        """Resolve a Tk color name to 8-bit RGB exactly as Tk draws it."""
+        return tuple(v // 257 for v in self.winfo_rgb(color))
+
+    def scene(self) -> Scene:
+        """Snapshot of the canvas contents as a scene graph."""
+        buttons = []
+        for win_id, color in self.button_data:
+            x, y = self.canvas.coords(win_id)
+            buttons.append(Button(color, x, y))
+        cx, cy = self.canvas.coords(self.cursor)
+        return Scene(
+            width=self.canvas_width,
+            height=self.canvas_height,
+            buttons=buttons,
+            cursor=(cx, cy),
+            cursor_size=self.cursor_size,
+            markers=list(self.debug_markers),
+            background=self.canvas.cget("bg"),
+            highlight=int(self.canvas.cget("highlightthickness")),
+            highlight_color=self._rgb(self.canvas.cget("highlightbackground")),
+        )
+
+    @property
+    def frame_version(self):
+        """Increases every time the captured frame changes."""
+        return self.capture.version
+
+    def _mark_dirty(self, bbox):
+        """Report a canvas-coordinate bbox (as returned by canvas.bbox) as changed."""
+        if not bbox:
+            return
+        ox, oy = self.canvas.winfo_x(), self.canvas.winfo_y()
+        x1, y1, x2, y2 = bbox
+        self.capture.mark_dirty(x1 + ox, y1 + oy, x2 + ox, y2 + oy)
+
+    def clear_debug_markers(self):
+        self._mark_dirty(self.canvas.bbox("debug_marker"))
+        self.canvas.delete("debug_marker")
+        self.debug_markers = []
+
     def move_cursor(self, direction, times = 1):
+        # only the old and the final cursor positions show up in the next frame
+        self._mark_dirty(self.canvas.bbox(self.cursor))
         for _ in range(times):
             dx = dy = 0
             step = 10
@@ -113,46 +251,83 @@ class VDesktop(tk.Tk):
             if x2 > self.canvas_width:  self.canvas.move(self.cursor, self.canvas_width - x2, 0)
             if y2 > self.canvas_height: self.canvas.move(self.cursor, 0, self.canvas_height - y2)
             self.canvas.tag_raise(self.cursor)
+        self._mark_dirty(self.canvas.bbox(self.cursor))
 
     def check_click(self):
         bbox_cursor = self.canvas.bbox(self.cursor)
         if not bbox_cursor:
             return
-        x1_c, y1_c, x2_c, y2_c = bbox_cursor
-        for win_id, color in self.button_data:
-            bbox_btn = self.canvas.bbox(win_id)
-            if not bbox_btn:
-                continue
-            x1_b, y1_b, x2_b, y2_b = bbox_btn
-            if x1_c < x2_b and x2_c > x1_b and y1_c < y2_b and y2_c > y1_b:
-                print(f"CLICKED {color}")
-                return
+        color = self.hit_index.hit(bbox_cursor)
+        self.m_clicks.inc(result="miss" if color is None else "hit")
+        if color is not None:
+            print(f"CLICKED {color}")
+            return color
         print("Click found nothing")
+        return None
 
     def screenshot(self):
+        if self.render == "scene":
+            frame = self.capture.grab(self.scene())
+            self.capture.save("img/tk_window.png")
+            return frame
+
+        # the HUD is for humans only, keep it out of agent screenshots
+        hud_state = self.canvas.itemcget(self.hud, "state")
+        if hud_state != "hidden":
+            self._mark_dirty(self.canvas.bbox(self.hud))
+            self.canvas.itemconfigure(self.hud, state="hidden")
         self.update_idletasks()
         x1 = self.winfo_rootx()
         y1 = self.winfo_rooty()
         width = self.winfo_width()
         height = self.winfo_height()
 
-        with mss.mss() as sct:
-            monitor = {"top": y1, "left": x1, "width": width, "height": height}
-            output = "img/tk_window.png"
-            sct_img = sct.grab(monitor)
-            mss.tools.to_png(sct_img.rgb, sct_img.size, output=output)
+        # widgets below the canvas (entry text, mode menu) are not tracked, so always refresh that strip
+        bar_top = self.canvas.winfo_y() + self.canvas.winfo_height()
+        self.capture.mark_dirty(0, bar_top, width, height)
+
+        frame = self.capture.grab(x1, y1, width, height)
+        self.capture.save("img/tk_window.png")
+        if hud_state != "hidden":
+            self.canvas.itemconfigure(self.hud, state=hud_state)
+            self._mark_dirty(self.canvas.bbox(self.hud))
+        return frame
 
     def on_submit(self, event=None):
         text = self.entry.get()
         self.entry.delete(0, tk.END)
 
-        self.screenshot()
+        if not (self.profiling and text):
+            self._run_command(text)
+            return
+        self.command_count += 1
+        profiler = SamplingProfiler().start()
+        try:
+            self._run_command(text)
+        finally:
+            profiler.stop()
+            path = f"{self.profile_dir}/cmd_{self.command_count:04d}_{time.strftime('%H%M%S')}.folded"
+            profiler.write(path)
+            print(f"Profile ({profiler.samples} samples) written to {path}")
 
+    def _run_command(self, text):
         if text != "":
-            # Clear previous debug markers
-            self.canvas.delete("debug_marker")
-            
-            output, points = self.agent.ask(text, "img/tk_window.png", mode=self.mode_var.get())
+            # the previous command's markers must not end up in the agent's (or a shard's) frame
+            self.clear_debug_markers()
+        t0 = time.perf_counter()
+        frame = self.screenshot()
+        scene = self.scene()
+        capture_s = time.perf_counter() - t0
+        self.m_capture.observe(capture_s, render=self.render)
+
+        if text != "":
+            t0 = time.perf_counter()
+            output, points = self.agent.ask(text, "img/tk_window.png", mode=self.mode_var.get(), scene=scene)
+            agent_s = time.perf_counter() - t0
+            self.m_agent.observe(agent_s, mode=self.mode_var.get())
+            raw_response = self.agent.last_response
+            usage = self.agent.last_usage
+            route = self.agent.last_route
             
             # Draw debug points
             cx, cy = self.canvas.coords(self.cursor)
@@ -169,12 +344,44 @@ class VDesktop(tk.Tk):
                 self.canvas.create_oval(tx-r, ty-r, tx+r, ty+r, fill=color, outline="white", width=2, tags="debug_marker")
                 # Draw label
                 self.canvas.create_text(tx, ty-15, text=p['label'], fill=color, font=("Arial", 8), tags="debug_marker")
+                self.debug_markers.append(Marker(tx, ty, color, p['label']))
+            self._mark_dirty(self.canvas.bbox("debug_marker"))
 
             debug = self.agent.consult(text, "img/tk_window.png")
             print(f"Response: {output} | DEBUG: {debug}")
             print(output)
+            t0 = time.perf_counter()
+            clicks = []
             for action in output:
-               self.execute(action)
+               result = self.execute(action)
+               if action.split()[:1] == ["click"]:
+                   clicks.append(result)
+            execute_s = time.perf_counter() - t0
+            self.m_execute.observe(execute_s)
+            target = parse_target_color(text)
+            outcome = "none" if target is None else ("hit" if target in clicks else "miss")
+            self.m_commands.inc(mode=self.mode_var.get(), outcome=outcome)
+
+            if self.distill is not None and frame is not None and raw_response is not None:
+                self.distill.add(frame, text, output, clicks, scene)
+
+            if self.trace is not None and frame is not None:
+                self.trace.record(frame, {
+                    "time": time.time(),
+                    "instruction": text,
+                    "mode": self.mode_var.get(),
+                    "protocol": getattr(self.agent, "protocol", "moves"),
+                    "observation": getattr(self.agent, "observation", "image"),
+                    "target": target,
+                    "raw_response": raw_response,
+                    "actions": output,
+                    "points": [{k: float(v) if k in ("dx", "dy") else v for k, v in p.items()} for p in points],
+                    "timings": {"capture": capture_s, "agent": agent_s, "execute": execute_s},
+                    "usage": usage,
+                    "route": route,
+                    "scene": scene.to_dict(),
+                    "after": {"cursor": list(self.canvas.coords(self.cursor)), "clicks": clicks},
+                })
             
 
     def execute(self, command: str):
@@ -188,7 +395,7 @@ class VDesktop(tk.Tk):
         }
 
         if action in tasks:
-            tasks[action](*params)
+            return tasks[action](*params)
         else:
             print(f"Unknown action: {action!r}")
 
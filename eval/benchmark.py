@@ -1,9 +1,10 @@
 import argparse
-import math
+import functools
 import random
 import sys
 import os
 import json
+import time
 from PIL import Image, ImageDraw
 
 # Ensure we can import from adt
@@ -11,12 +12,18 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from adt.agent_func import Agent
 from adt.utility import draw_grid
+from adt.layout import button_colors, sample_positions
+from adt.scene import Scene, Button
+from adt.executor import RequestExecutor
+from adt.fake_backend import FakeBackend
+from eval.results_store import ResultsStore
 
 class Benchmark:
     def __init__(self, agents, env_setup_func):
         """
-        :param agents: Dict of {name: agent_func}
-        :param env_setup_func: Function that returns (target_coords, image_path, instruction).
+        :param agents: Dict of {name: agent_func}. agent_func(instruction, image_path, scene=None) -> actions.
+        :param env_setup_func: Function that returns (target_coords, image_path, instruction), optionally
+            followed by the adt.scene.Scene of the test image.
         """
         self.agents = agents
         self.env_setup_func = env_setup_func
@@ -80,15 +87,38 @@ class Benchmark:
                 
         return curr_x, curr_y
 
-    def run(self, num_tests=5, output_file="eval/results.json"):
+    def run(self, num_tests=5, output_file="eval/results.json", store_file="eval/results.npz",
+            seed=None, run_id=None):
+        """
+        Runs every agent on num_tests generated test cases.
+        Test i is generated after seeding `random` with seed + i, so runs sharing a seed see the
+        same cases. Rows are appended to the columnar store at store_file keyed by
+        (run_id, test_id, seed, agent); output_file keeps the per-agent JSON for inspection.
+        """
+        if seed is None:
+            seed = random.randrange(2 ** 31)
+        if run_id is None:
+            run_id = time.strftime("%Y%m%d-%H%M%S")
         all_results = {name: [] for name in self.agents}
-        print(f"Running {num_tests} tests for agents: {list(self.agents.keys())}...")
+        records = []
+        setup_failures = 0
+        print(f"Running {num_tests} tests for agents: {list(self.agents.keys())} (run {run_id}, seed {seed})...")
         
         for i in range(num_tests):
             print(f"\nTest {i+1}/{num_tests}")
             
             # Setup environment
-            target_info, img_path, instruction = self.env_setup_func()
+            test_seed = seed + i
+            random.seed(test_seed)
+            try:
+                setup = self.env_setup_func()
+            except ValueError as e:
+                # e.g. a layout too dense to place; the test is dropped, not counted against agents
+                print(f"Setup failed, skipping test: {e}")
+                setup_failures += 1
+                continue
+            target_info, img_path, instruction = setup[:3]
+            scene = setup[3] if len(setup) > 3 else None
             target_x, target_y, target_w, target_h = target_info
             
             # Initial cursor position (center of image usually)
@@ -100,12 +130,16 @@ class Benchmark:
             
             for agent_name, agent_func in self.agents.items():
                 print(f"  Running {agent_name}...")
+                start = time.perf_counter()
                 try:
-                    actions = agent_func(instruction, img_path)
-                    print(f"    Actions: {actions}")
+                    actions = agent_func(instruction, img_path, scene=scene)
+                    latency = time.perf_counter() - start
+                    print(f"    Actions: {actions} ({latency * 1000:.0f} ms)")
                 except Exception as e:
                     print(f"    Agent failed: {e}")
-                    all_results[agent_name].append({"success": False, "distance": None, "error": str(e)})
+                    all_results[agent_name].append({"test_id": i, "seed": test_seed, "success": False, "distance": None, "error": str(e)})
+                    records.append({"run_id": run_id, "test_id": i, "seed": test_seed, "agent": agent_name,
+                                    "success": False, "error": True})
                     continue
 
                 # Simulate result
@@ -119,78 +153,90 @@ class Benchmark:
                 
                 all_results[agent_name].append({
                     "test_id": i,
+                    "seed": test_seed,
                     "success": success,
                     "distance": dist,
+                    "latency": latency,
                     "actions": actions
                 })
+                usage = getattr(agent_func, "last_usage", None) or {}
+                records.append({"run_id": run_id, "test_id": i, "seed": test_seed, "agent": agent_name,
+                                "success": success, "distance": dist, "latency": latency,
+                                "input_tokens": usage.get("input_tokens"), "output_tokens": usage.get("output_tokens")})
             
         # Save to JSON
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
         with open(output_file, 'w') as f:
             json.dump(all_results, f, indent=2)
         print(f"\nResults saved to {output_file}")
+
+        # Append to the columnar store
+        store = ResultsStore.from_records(records)
+        if store_file:
+            if os.path.exists(store_file):
+                store = ResultsStore.load(store_file).append(store)
+            store.save(store_file)
+            print(f"Results appended to {store_file} ({len(store)} rows)")
             
         # Summary
         print("\nBenchmark Complete.")
+        if setup_failures:
+            print(f"{setup_failures}/{num_tests} tests skipped because their layout could not be generated")
+        num_tests -= setup_failures
         for agent_name, results in all_results.items():
             valid_results = [r for r in results if r.get("distance") is not None]
             success_count = sum(1 for r in valid_results if r.get("success"))
             avg_dist = sum(r["distance"] for r in valid_results) / len(valid_results) if valid_results else 0
-            print(f"{agent_name}: Success Rate: {success_count}/{num_tests} ({success_count/num_tests*100:.1f}%), Avg Dist: {avg_dist:.2f}px")
+            rate = success_count / num_tests * 100 if num_tests else 0.0
+            print(f"{agent_name}: Success Rate: {success_count}/{num_tests} ({rate:.1f}%), Avg Dist: {avg_dist:.2f}px")
 
 
-def mock_env_setup():
+def mock_env_setup(img_path="img/benchmark_test.png", width=600, height=350, num_buttons=5):
     """
     Generates a synthetic test case without using Tkinter.
     Creates an image with random colored squares and picks one as target.
     """
-    w, h = 600, 350
+    w, h = width, height
     img = Image.new("RGB", (w, h), "white")
     draw = ImageDraw.Draw(img)
     
-    colors = ["green", "red", "orange", "blue", "purple"]
-    targets = []
-    
     # Draw cursor at center
     cx, cy = w // 2, h // 2
     draw.rectangle([cx-6, cy-6, cx+6, cy+6], fill="black")
     
-    # Draw buttons
-    min_dist = 80
-    positions = []
-    
     # target_color = random.choice(colors)
     target_color = "red" # Fixed target for benchmark fairness
     target_rect = None
+    buttons = []
     
-    for color in colors:
-        # Try to find a spot
-        for _ in range(100):
-            x = random.randint(min_dist, w - min_dist)
-            y = random.randint(min_dist, h - min_dist)
-            if all(math.hypot(x - x2, y - y2) > min_dist for x2, y2 in positions):
-                positions.append((x, y))
-                # Draw button (centered at x,y, size 40x30)
-                x1, y1 = x - 20, y - 15
-                x2, y2 = x + 20, y + 15
-                draw.rectangle([x1, y1, x2, y2], fill=color, outline="black")
-                
-                if color == target_color:
-                    target_rect = (x, y, 40, 30) # center_x, center_y, w, h
-                break
+    # sample_positions never overlaps buttons; keep them off the cursor too
+    positions = sample_positions(num_buttons, w, h, avoid=[(cx, cy, 40)])
+    # only one red button, so "click red" names exactly one target however many buttons there are
+    for color, (x, y) in zip(button_colors(num_buttons, unique=target_color), positions):
+        # Draw button (centered at x,y, size 40x30)
+        x1, y1 = x - 20, y - 15
+        x2, y2 = x + 20, y + 15
+        draw.rectangle([x1, y1, x2, y2], fill=color, outline="black")
+        buttons.append(Button(color, x, y, bd=0))
+
+        if color == target_color and target_rect is None:
+            target_rect = (x, y, 40, 30) # center_x, center_y, w, h
     
-    if not os.path.exists("img"):
-        os.makedirs("img")
-    img_path = "img/benchmark_test.png"
+    os.makedirs(os.path.dirname(img_path) or ".", exist_ok=True)
     img.save(img_path)
-    
-    return target_rect, img_path, f"click {target_color}"
 
-def get_model_agent():
-    from model.inference import CursorPredictor
-    predictor = CursorPredictor()
+    scene = Scene(width=w, height=h, buttons=buttons, cursor=(cx, cy))
+    return target_rect, img_path, f"click {target_color}", scene
+
+def get_model_agent(server_socket=None):
+    if server_socket:
+        from model.server import InferenceClient
+        predictor = InferenceClient(server_socket)
+    else:
+        from model.inference import CursorPredictor
+        predictor = CursorPredictor()
     
-    def model_agent_func(instruction, img_path):
+    def model_agent_func(instruction, img_path, scene=None):
         # Model ignores instruction, just predicts movement
         dx, dy = predictor.predict(img_path)
         # Convert dx, dy to "move" actions
@@ -215,32 +261,96 @@ def get_model_agent():
         return actions
     return model_agent_func
 
-def get_default_agent():
+def get_locator_agent():
+    """
+    Color-segmentation locator. Exact on the synthetic scenes, so it doubles as the
+    ground-truth oracle the other agents are compared against.
+    """
     agent_instance = Agent()
+    def locator_agent_func(instruction, img_path, scene=None):
+        actions, _ = agent_instance.ask(instruction, img_path, mode="Locator")
+        return actions
+    return locator_agent_func
+
+def get_default_agent(observation="image", executor=None, backend=None, protocol="moves"):
+    agent_instance = Agent(observation=observation, executor=executor, backend=backend, protocol=protocol)
     # Wrapper to handle new return signature (actions, points)
-    def wrapper(instruction, img_path):
-        actions, _ = agent_instance.ask(instruction, img_path, mode="Gemini")
+    def wrapper(instruction, img_path, scene=None):
+        actions, _ = agent_instance.ask(instruction, img_path, mode="Gemini", scene=scene)
+        # token counts of this call, picked up by Benchmark.run
+        wrapper.last_usage = agent_instance.last_usage
         return actions
     return wrapper
 
+def get_routed_agent(calibration=None, executor=None, backend=None, protocol="moves"):
+    """
+    ImageShot answers when its MC-dropout spread is under the calibrated threshold, Gemini otherwise.
+    """
+    from adt.agent_func import ConfidenceRouter, DEFAULT_CALIBRATION
+    router = ConfidenceRouter.from_file(calibration or DEFAULT_CALIBRATION)
+    agent_instance = Agent(executor=executor, backend=backend, router=router, protocol=protocol)
+    def routed_agent_func(instruction, img_path, scene=None):
+        actions, _ = agent_instance.ask(instruction, img_path, mode="Routed", scene=scene)
+        routed_agent_func.last_usage = agent_instance.last_usage
+        print(f"    Route: {agent_instance.last_route}")
+        return actions
+    routed_agent_func.router = router
+    return routed_agent_func
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run Agent Benchmark")
     parser.add_argument("--tests", type=int, default=5, help="Number of tests to run")
-    parser.add_argument("--agent", type=str, default="default", choices=["default", "model", "hybrid"], help="Agent to use")
+    parser.add_argument("--agent", type=str, default="default", choices=["default", "model", "hybrid", "routed", "locator", "observation", "protocol"], help="Agent to use")
+    parser.add_argument("--server-socket", type=str, default=None, help="Use a running model.server instance for ImageShot")
+    parser.add_argument("--deadline", type=float, default=30.0, help="Seconds a Gemini call may take")
+    parser.add_argument("--hedge", action="store_true", help="Hedge Gemini calls slower than the recent p95")
+    parser.add_argument("--fake-backend", action="store_true", help="Answer Gemini calls with the offline FakeBackend")
+    parser.add_argument("--fake-latency-ms", type=float, default=800.0, help="Median FakeBackend latency")
+    parser.add_argument("--fake-error-rate", type=float, default=0.0, help="Fraction of FakeBackend calls that fail with 503/429")
+    parser.add_argument("--seed", type=int, default=None, help="Base seed for test generation (and FakeBackend)")
+    parser.add_argument("--run-id", type=str, default=None, help="Run identifier stored with each result (default: timestamp)")
+    parser.add_argument("--store", type=str, default="eval/results.npz", help="Columnar results store to append to")
+    parser.add_argument("--observation", type=str, default="image", choices=["image", "text", "text+image"], help="What the Gemini agent is shown")
+    parser.add_argument("--protocol", type=str, default="moves", choices=["moves", "point"], help="How the Gemini agent answers: 10px moves or JSON target coordinates")
+    parser.add_argument("--calibration", type=str, default=None, help="Router calibration JSON from eval/calibrate.py (routed agent)")
+    parser.add_argument("--width", type=int, default=600, help="Test canvas width")
+    parser.add_argument("--height", type=int, default=350, help="Test canvas height")
+    parser.add_argument("--buttons", type=int, default=5, help="Buttons per test canvas")
     
     args = parser.parse_args()
     
     agents = {}
+    executor = RequestExecutor(deadline=args.deadline, hedge=args.hedge)
+    backend = None
+    if args.fake_backend:
+        backend = FakeBackend(latency_ms=args.fake_latency_ms, error_rate=args.fake_error_rate, seed=args.seed)
     
     if args.agent == "default":
-        agents["Gemini"] = get_default_agent()
+        agents["Gemini"] = get_default_agent(args.observation, executor, backend, args.protocol)
     elif args.agent == "model":
-        agents["ImageShot"] = get_model_agent()
+        agents["ImageShot"] = get_model_agent(args.server_socket)
     elif args.agent == "hybrid":
-        agents["Gemini"] = get_default_agent()
-        agents["ImageShot"] = get_model_agent()
+        agents["Gemini"] = get_default_agent(executor=executor, backend=backend, protocol=args.protocol)
+        agents["ImageShot"] = get_model_agent(args.server_socket)
+    elif args.agent == "routed":
+        agents["Routed"] = get_routed_agent(args.calibration, executor, backend, args.protocol)
+        agents["Gemini"] = get_default_agent(executor=executor, backend=backend, protocol=args.protocol)
+    elif args.agent == "locator":
+        agents["Locator"] = get_locator_agent()
+    elif args.agent == "observation":
+        # Same Gemini agent, one entry per observation mode
+        agents["Gemini-image"] = get_default_agent("image", executor, backend, args.protocol)
+        agents["Gemini-text"] = get_default_agent("text", executor, backend, args.protocol)
+        agents["Gemini-text+image"] = get_default_agent("text+image", executor, backend, args.protocol)
+    elif args.agent == "protocol":
+        # Same Gemini agent, one entry per answer protocol
+        agents["Gemini-moves"] = get_default_agent(args.observation, executor, backend, "moves")
+        agents["Gemini-point"] = get_default_agent(args.observation, executor, backend, "point")
 
-    benchmark = Benchmark(agents, mock_env_setup)
-    benchmark.run(num_tests=args.tests)
+    env_setup = functools.partial(mock_env_setup, width=args.width, height=args.height, num_buttons=args.buttons)
+    benchmark = Benchmark(agents, env_setup)
+    benchmark.run(num_tests=args.tests, store_file=args.store, seed=args.seed, run_id=args.run_id)
+    if "Routed" in agents:
+        print(f"Router: {agents['Routed'].router.stats}")
 
 
@@ -0,0 +1,98 @@
+import argparse
+import json
+import os
+import random
+import sys
+
+import numpy as np
+import torch
+
+# Ensure we can import from adt and model
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from adt.agent_func import Agent, DEFAULT_CALIBRATION
+from eval.benchmark import Benchmark, mock_env_setup
+from model.inference import CursorPredictor
+
+
+def collect(predictor, num_tests=500, samples=16, batch_size=32, seed=0, width=600, height=350, num_buttons=5):
+    """
+    Runs ImageShot with MC-dropout on num_tests generated cases.
+    Returns (std, success) arrays: prediction spread in pixels and whether the resulting click hits.
+    """
+    scorer = Benchmark({}, None)
+    to_actions = Agent()._dxdy_to_actions
+    stds, successes = [], []
+    for start in range(0, num_tests, batch_size):
+        cases, tensors = [], []
+        for i in range(start, min(num_tests, start + batch_size)):
+            random.seed(seed + i)
+            img_path = f"img/calibrate/case_{i - start:03d}.png"
+            target, img_path, _, scene = mock_env_setup(img_path, width, height, num_buttons)
+            cases.append((target, scene))
+            tensors.append(predictor.preprocess(img_path))
+        preds = predictor.predict_batch_with_uncertainty(torch.stack(tensors), samples)
+        for (target, scene), (dx, dy, std) in zip(cases, preds):
+            fx, fy = scorer.simulate_actions(to_actions(dx, dy), width // 2, height // 2, width, height)
+            stds.append(std)
+            successes.append(scorer.determine_distance(*target, fx, fy) == 0)
+        print(f"{len(stds)}/{num_tests} cases")
+    return np.asarray(stds, dtype=np.float64), np.asarray(successes, dtype=bool)
+
+
+def choose_threshold(std, success, target_precision=0.95):
+    """
+    Largest spread threshold whose locally answered cases (std <= threshold) reach target_precision.
+    Returns (threshold, coverage, precision); threshold is -1.0 (nothing answered locally) if no prefix qualifies.
+    """
+    order = np.argsort(std, kind="stable")
+    std, success = std[order], success[order]
+    precision = np.cumsum(success) / np.arange(1, len(std) + 1)
+    # a threshold can only sit between distinct std values
+    last_of_value = np.append(std[1:] != std[:-1], True)
+    ok = np.flatnonzero((precision >= target_precision) & last_of_value)
+    if len(ok) == 0:
+        return -1.0, 0.0, None
+    k = ok[-1]
+    return float(std[k]), (k + 1) / len(std), float(precision[k])
+
+
+def curve(std, success, quantiles=(0.1, 0.25, 0.5, 0.75, 0.9, 1.0)):
+    """(threshold, coverage, precision) at a few std quantiles, for the printed table."""
+    rows = []
+    for q in quantiles:
+        t = float(np.quantile(std, q))
+        local = std <= t
+        rows.append((t, local.mean(), success[local].mean() if local.any() else float("nan")))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate the ImageShot/Gemini confidence router")
+    parser.add_argument("--tests", type=int, default=500, help="Number of generated cases")
+    parser.add_argument("--samples", type=int, default=16, help="MC-dropout samples per prediction")
+    parser.add_argument("--precision", type=float, default=0.95, help="Required success rate of locally answered commands")
+    parser.add_argument("--model", type=str, default="model/checkpoints/imageshot_model.pth", help="ImageShot checkpoint")
+    parser.add_argument("--seed", type=int, default=10_000, help="Base seed (keep disjoint from benchmark seeds)")
+    parser.add_argument("--output", type=str, default=DEFAULT_CALIBRATION, help="Where to write the calibration JSON")
+    args = parser.parse_args()
+
+    predictor = CursorPredictor(model_path=args.model)
+    std, success = collect(predictor, args.tests, args.samples, seed=args.seed)
+    threshold, coverage, precision = choose_threshold(std, success, args.precision)
+
+    print(f"\nImageShot success overall: {success.mean() * 100:.1f}%")
+    print(f"{'threshold':>10} {'local':>7} {'precision':>10}")
+    for t, cov, prec in curve(std, success):
+        print(f"{t:>10.2f} {cov * 100:>6.1f}% {prec * 100:>9.1f}%")
+    if precision is None:
+        print(f"\nNo threshold reaches {args.precision * 100:.0f}% success; every command will escalate to Gemini")
+    else:
+        print(f"\nChosen threshold {threshold:.2f}px: {coverage * 100:.1f}% answered locally at {precision * 100:.1f}% success")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump({"threshold": threshold, "samples": args.samples, "target_precision": args.precision,
+                   "coverage": coverage, "precision": precision, "tests": args.tests,
+                   "seed": args.seed, "model": args.model}, f, indent=2)
+    print(f"Calibration saved to {args.output}")
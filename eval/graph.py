@@ -1,89 +1,182 @@
-import json
+import argparse
+import os
+import sys
 import matplotlib.pyplot as plt
 import numpy as np
 from scipy import stats
-import os
 
-def load_results(filepath="eval/results.json"):
-    with open(filepath, 'r') as f:
-        return json.load(f)
-
-def analyze_and_plot(results):
-    agents = list(results.keys())
-    
-    # Extract data
-    distances = {agent: [] for agent in agents}
-    successes = {agent: [] for agent in agents}
-    
-    for agent in agents:
-        # Ensure we align data by test_id if possible, but list order should match 
-        # since benchmark runs sequentially in the same loop.
-        for r in results[agent]:
-            if r.get("distance") is not None:
-                distances[agent].append(r["distance"])
-                successes[agent].append(1 if r["success"] else 0)
-                
-    # Calculate stats
-    means_dist = [np.mean(distances[a]) for a in agents]
-    sems_dist = [stats.sem(distances[a]) for a in agents]
-    
-    means_succ = [np.mean(successes[a]) for a in agents]
-    sems_succ = [stats.sem(successes[a]) for a in agents]
-    
+# Ensure we can import from eval when run as a script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from eval.results_store import ResultsStore
+
+LATENCY_PERCENTILES = [50, 90, 95, 99]
+
+
+def load_results(paths=("eval/results.npz",)):
+    """
+    Load and merge one or more result files (.npz stores or legacy results.json).
+    """
+    return ResultsStore.merge([ResultsStore.load(p) for p in paths])
+
+
+def bootstrap_ci(values, num_resamples=1000, alpha=0.05, seed=0, max_cells=20_000_000):
+    """
+    Percentile bootstrap confidence interval of the mean.
+    Resamples are drawn in chunks of at most max_cells indices to bound memory on large inputs.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n == 0:
+        return np.nan, np.nan
+    rng = np.random.default_rng(seed)
+    chunk = max(1, max_cells // n)
+    means = np.empty(num_resamples)
+    for start in range(0, num_resamples, chunk):
+        stop = min(num_resamples, start + chunk)
+        idx = rng.integers(0, n, size=(stop - start, n))
+        means[start:stop] = values[idx].mean(axis=1)
+    lo, hi = np.percentile(means, [100 * alpha / 2, 100 * (1 - alpha / 2)])
+    return lo, hi
+
+
+def summarize(store, num_resamples=1000):
+    """
+    Per-agent accuracy and latency summary, computed with grouped NumPy reductions.
+    Returns {agent: {...}}.
+    """
+    agent_names, agent_idx = np.unique(store["agent"], return_inverse=True)
+    valid = ~store["error"] & ~np.isnan(store["distance"])
+    n_agents = len(agent_names)
+
+    total = np.bincount(agent_idx, minlength=n_agents)
+    n_valid = np.bincount(agent_idx[valid], minlength=n_agents)
+    dist_sum = np.bincount(agent_idx[valid], weights=store["distance"][valid], minlength=n_agents)
+    succ_sum = np.bincount(agent_idx[valid], weights=store["success"][valid].astype(np.float64), minlength=n_agents)
+
+    summary = {}
+    for a, name in enumerate(agent_names):
+        mask = valid & (agent_idx == a)
+        latencies = store["latency"][mask]
+        latencies = latencies[~np.isnan(latencies)]
+        summary[str(name)] = {
+            "n": int(total[a]),
+            "n_valid": int(n_valid[a]),
+            "errors": int(total[a] - n_valid[a]),
+            "mean_distance": dist_sum[a] / n_valid[a] if n_valid[a] else np.nan,
+            "distance_ci": bootstrap_ci(store["distance"][mask], num_resamples),
+            "success_rate": succ_sum[a] / n_valid[a] if n_valid[a] else np.nan,
+            "success_ci": bootstrap_ci(store["success"][mask], num_resamples),
+            "latency_ms": dict(zip(LATENCY_PERCENTILES,
+                                   np.percentile(latencies, LATENCY_PERCENTILES) * 1000
+                                   if len(latencies) else [np.nan] * len(LATENCY_PERCENTILES))),
+        }
+    return summary
+
+
+def paired_tests(store):
+    """
+    Paired t-tests between every pair of agents, on the test cases both completed,
+    aligned by (run_id, test_id, seed) rather than by list position.
+    """
+    agents = store.agents()
+    out = []
+    for i in range(len(agents)):
+        for j in range(i + 1, len(agents)):
+            a1, a2 = agents[i], agents[j]
+            row = {"a": a1, "b": a2}
+            for column in ("distance", "success"):
+                x, y = store.paired(a1, a2, column)
+                row[f"n_{column}"] = len(x)
+                if len(x) > 1 and np.any(x != y):
+                    row[column] = stats.ttest_rel(x, y)
+                else:
+                    row[column] = None
+            out.append(row)
+    return out
+
+
+def analyze_and_plot(store, output="eval/benchmark_results.png", num_resamples=1000):
+    summary = summarize(store, num_resamples)
+    agents = list(summary.keys())
+
+    print(f"{'agent':<20} {'n':>7} {'err':>5} {'success':>8} {'95% CI':>17} {'dist':>8} "
+          + " ".join(f"{'p' + str(q):>7}" for q in LATENCY_PERCENTILES))
+    for name, s in summary.items():
+        lo, hi = s["success_ci"]
+        print(f"{name:<20} {s['n']:>7} {s['errors']:>5} {s['success_rate']:>8.3f} [{lo:>6.3f}, {hi:>6.3f}] "
+              f"{s['mean_distance']:>8.2f} " + " ".join(f"{s['latency_ms'][q]:>7.0f}" for q in LATENCY_PERCENTILES))
+
     # Plotting
-    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
-    
-    # Distance Plot
+    fig, (ax1, ax2, ax3) = plt.subplots(1, 3, figsize=(17, 5))
     x = np.arange(len(agents))
     width = 0.35
-    
-    rects1 = ax1.bar(x, means_dist, width, yerr=sems_dist, capsize=5, label='Distance', color='skyblue')
+
+    def ci_err(key, mean_key):
+        means = np.array([summary[a][mean_key] for a in agents])
+        cis = np.array([summary[a][key] for a in agents]).reshape(-1, 2)
+        return means, np.abs(np.stack([means - cis[:, 0], cis[:, 1] - means]))
+
+    # Distance Plot
+    means_dist, err_dist = ci_err("distance_ci", "mean_distance")
+    ax1.bar(x, means_dist, width, yerr=err_dist, capsize=5, label='Distance', color='skyblue')
     ax1.set_ylabel('Pixels')
     ax1.set_title('Average Distance to Target (Lower is Better)')
     ax1.set_xticks(x)
     ax1.set_xticklabels(agents)
     ax1.grid(axis='y', linestyle='--', alpha=0.7)
-    
+
     # Success Rate Plot
-    rects2 = ax2.bar(x, means_succ, width, yerr=sems_succ, capsize=5, color='lightgreen', label='Success Rate')
+    means_succ, err_succ = ci_err("success_ci", "success_rate")
+    ax2.bar(x, means_succ, width, yerr=err_succ, capsize=5, color='lightgreen', label='Success Rate')
     ax2.set_ylabel('Rate (0-1)')
-    ax2.set_title('Success Rate (Higher is Better)')
+    ax2.set_title('Success Rate, 95% bootstrap CI (Higher is Better)')
     ax2.set_xticks(x)
     ax2.set_xticklabels(agents)
     ax2.set_ylim(0, 1.1)
     ax2.grid(axis='y', linestyle='--', alpha=0.7)
-    
+
+    # Latency Percentiles Plot
+    bar_w = 0.8 / len(LATENCY_PERCENTILES)
+    for k, q in enumerate(LATENCY_PERCENTILES):
+        ax3.bar(x + (k - (len(LATENCY_PERCENTILES) - 1) / 2) * bar_w,
+                [summary[a]["latency_ms"][q] for a in agents], bar_w, label=f"p{q}")
+    ax3.set_ylabel('Milliseconds')
+    ax3.set_title('Latency Percentiles (Lower is Better)')
+    ax3.set_xticks(x)
+    ax3.set_xticklabels(agents)
+    ax3.legend()
+    ax3.grid(axis='y', linestyle='--', alpha=0.7)
+
     plt.tight_layout()
-    plt.savefig("eval/benchmark_results.png")
-    print("Graph saved to eval/benchmark_results.png")
-    
-    # Statistical Analysis (Paired t-test if 2 agents)
-    if len(agents) == 2:
-        a1, a2 = agents[0], agents[1]
-        print(f"\nStatistical Analysis ({a1} vs {a2}):")
-        
-        # Distance
-        # Check if we have enough data
-        if len(distances[a1]) > 1 and len(distances[a2]) > 1:
-            t_stat, p_val = stats.ttest_rel(distances[a1], distances[a2])
-            print(f"Distance: t-stat={t_stat:.4f}, p-value={p_val:.4f}")
-            if p_val < 0.05:
-                print("  -> Significant difference in distance.")
-            else:
-                print("  -> No significant difference in distance.")
-        
-        # Success
-        if len(successes[a1]) > 1 and len(successes[a2]) > 1:
-            t_stat, p_val = stats.ttest_rel(successes[a1], successes[a2])
-            print(f"Success: t-stat={t_stat:.4f}, p-value={p_val:.4f}")
-            if p_val < 0.05:
-                print("  -> Significant difference in success rate.")
+    plt.savefig(output)
+    print(f"Graph saved to {output}")
+
+    # Statistical Analysis (paired t-tests on aligned test cases)
+    for row in paired_tests(store):
+        print(f"\nStatistical Analysis ({row['a']} vs {row['b']}):")
+        for column, label in (("distance", "Distance"), ("success", "Success")):
+            res = row[column]
+            if res is None:
+                print(f"{label}: not enough paired data ({row[f'n_{column}']} shared tests)")
+                continue
+            print(f"{label}: t-stat={res.statistic:.4f}, p-value={res.pvalue:.4f} over {row[f'n_{column}']} shared tests")
+            if res.pvalue < 0.05:
+                print(f"  -> Significant difference in {label.lower()}.")
             else:
-                print("  -> No significant difference in success rate.")
+                print(f"  -> No significant difference in {label.lower()}.")
+
 
 if __name__ == "__main__":
-    if not os.path.exists("eval/results.json"):
+    parser = argparse.ArgumentParser(description="Analyze benchmark results")
+    parser.add_argument("paths", nargs="*", default=None, help="Result stores (.npz) or legacy results.json files to merge")
+    parser.add_argument("--output", type=str, default="eval/benchmark_results.png", help="Where to save the graph")
+    parser.add_argument("--bootstrap", type=int, default=1000, help="Bootstrap resamples for confidence intervals")
+    args = parser.parse_args()
+
+    paths = args.paths or [p for p in ("eval/results.npz", "eval/results.json") if os.path.exists(p)][:1]
+    if not paths:
         print("No results found. Run benchmark.py first.")
     else:
-        results = load_results()
-        analyze_and_plot(results)
+        store = load_results(paths)
+        analyze_and_plot(store, output=args.output, num_resamples=args.bootstrap)
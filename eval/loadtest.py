@@ -0,0 +1,96 @@
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Ensure we can import from adt
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from adt.agent_func import Agent
+from adt.executor import RequestExecutor
+from adt.fake_backend import FakeBackend
+from eval.benchmark import Benchmark, mock_env_setup
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return float("nan")
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run(num_requests=500, concurrency=16, cases=32, observation="text", executor=None, backend=None, seed=0):
+    """
+    Fire num_requests Agent.ask calls from `concurrency` threads against an offline backend.
+    Test cases are generated up front (one image file each) and reused round-robin.
+    """
+    random.seed(seed)
+    tests = [mock_env_setup(f"img/loadtest/case_{i:03d}.png") for i in range(cases)]
+    agent = Agent(observation=observation, executor=executor, backend=backend)
+    scorer = Benchmark({}, None)
+
+    def one(i):
+        target, img_path, instruction, scene = tests[i % len(tests)]
+        start = time.perf_counter()
+        try:
+            actions, _ = agent.ask(instruction, img_path, mode="Gemini", scene=scene)
+        except Exception as e:
+            return time.perf_counter() - start, False, type(e).__name__
+        latency = time.perf_counter() - start
+        w, h = scene.width, scene.height
+        fx, fy = scorer.simulate_actions(actions, w // 2, h // 2, w, h)
+        success = scorer.determine_distance(*target, fx, fy) == 0
+        return latency, success, None
+
+    wall = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(num_requests)))
+    wall = time.perf_counter() - wall
+
+    latencies = [r[0] for r in results if r[2] is None]
+    errors = {}
+    for r in results:
+        if r[2] is not None:
+            errors[r[2]] = errors.get(r[2], 0) + 1
+    return {
+        "requests": num_requests,
+        "wall_s": wall,
+        "throughput_rps": num_requests / wall,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "success_rate": sum(1 for r in results if r[1]) / num_requests,
+        "errors": errors,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline load test of Agent.ask against FakeBackend")
+    parser.add_argument("--requests", type=int, default=500, help="Total requests")
+    parser.add_argument("--concurrency", type=int, default=16, help="Client threads")
+    parser.add_argument("--observation", type=str, default="text", choices=["image", "text", "text+image"])
+    parser.add_argument("--latency", type=str, default="lognormal", choices=["constant", "normal", "lognormal", "exponential"])
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="Median backend latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Relative latency spread")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of backend calls failing with 503/429")
+    parser.add_argument("--deadline", type=float, default=30.0, help="Executor deadline in seconds")
+    parser.add_argument("--max-concurrency", type=int, default=16, help="Executor in-flight cap")
+    parser.add_argument("--rate", type=float, default=None, help="Executor rate limit (calls/s)")
+    parser.add_argument("--hedge", action="store_true", help="Enable hedged requests")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for test cases and backend")
+    args = parser.parse_args()
+
+    backend = FakeBackend(latency=args.latency, latency_ms=args.latency_ms, latency_sigma=args.latency_sigma,
+                          error_rate=args.error_rate, seed=args.seed)
+    executor = RequestExecutor(deadline=args.deadline, max_concurrency=args.max_concurrency,
+                               rate=args.rate, burst=args.max_concurrency, hedge=args.hedge)
+    summary = run(args.requests, args.concurrency, observation=args.observation,
+                  executor=executor, backend=backend, seed=args.seed)
+
+    print(f"Requests: {summary['requests']} in {summary['wall_s']:.2f}s ({summary['throughput_rps']:.1f} req/s)")
+    print(f"Latency p50/p95/p99: {summary['p50_ms']:.0f} / {summary['p95_ms']:.0f} / {summary['p99_ms']:.0f} ms")
+    print(f"Success rate: {summary['success_rate'] * 100:.1f}%")
+    print(f"Errors: {summary['errors'] or 'none'}")
+    print(f"Backend calls: {backend.calls}, executor stats: {executor.stats}")
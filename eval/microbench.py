@@ -0,0 +1,228 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import timeit
+
+from PIL import Image
+
+# Ensure we can import from adt, eval and model
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from adt.layout import sample_positions
+from adt.utility import draw_grid, parse_moves
+
+DEFAULT_BASELINE = "eval/microbench_baseline.json"
+FRAME_SIZES = [(600, 350), (1920, 1080), (3840, 2160)]
+ACTION_COUNTS = [10, 100, 1000]
+# (buttons, width, height): dense desktops sample_positions has to place without failing
+LAYOUTS = [(5, 600, 350), (40, 600, 350), (100, 600, 350), (300, 1600, 900), (500, 1920, 1080)]
+
+
+class Skip(Exception):
+    """Raised by a case's setup when it cannot run here (no display, missing checkpoint, ...)."""
+
+
+def _random_actions(n, rng):
+    actions = []
+    for _ in range(n):
+        if rng.random() < 0.1:
+            actions.append("click")
+        else:
+            actions.append(f"move {rng.choice(['left', 'right', 'up', 'down'])} {rng.randint(1, 30)}")
+    return actions
+
+
+def _agent():
+    # adt.agent_func pulls in torch and google.genai, which a headless box may not have
+    try:
+        from adt.agent_func import Agent
+    except ImportError as e:
+        raise Skip(f"agent dependencies unavailable ({e})")
+    return Agent()
+
+
+def _scorer():
+    try:
+        from eval.benchmark import Benchmark
+    except ImportError as e:
+        raise Skip(f"benchmark dependencies unavailable ({e})")
+    return Benchmark({}, None)
+
+
+def build_cases(tmp):
+    """
+    Returns {name: setup}; setup() returns the zero-argument callable to time, or raises Skip.
+    Inputs are generated from a fixed seed so every run times the same work.
+    """
+    rng = random.Random(0)
+    cases = {}
+
+    for w, h in FRAME_SIZES:
+        def setup(w=w, h=h):
+            path = os.path.join(tmp, f"frame_{w}x{h}.png")
+            Image.new("RGB", (w, h), "white").save(path)
+            return lambda: draw_grid(path, None, 100)
+        cases[f"draw_grid[{w}x{h}]"] = setup
+
+    for n in ACTION_COUNTS:
+        actions = _random_actions(n, rng)
+        text = f"Response: [{', '.join(actions)}]"
+        cases[f"parse_moves[{n}]"] = lambda text=text: (lambda: parse_moves(text))
+        cases[f"actions_to_dxdy[{n}]"] = lambda actions=actions: (
+            lambda agent=_agent(): agent._actions_to_dxdy(actions))
+        cases[f"simulate_actions[{n}]"] = lambda actions=actions: (
+            lambda scorer=_scorer(): scorer.simulate_actions(actions, 300, 175, 600, 350))
+
+    offsets = [(rng.uniform(-600, 600), rng.uniform(-350, 350)) for _ in range(100)]
+    cases["dxdy_to_actions[x100]"] = lambda: (
+        lambda agent=_agent(): [agent._dxdy_to_actions(dx, dy) for dx, dy in offsets])
+    points = [(rng.uniform(0, 600), rng.uniform(0, 350)) for _ in range(100)]
+    cases["determine_distance[x100]"] = lambda: (
+        lambda scorer=_scorer(): [scorer.determine_distance(300, 175, 40, 30, x, y) for x, y in points])
+
+    for n, w, h in LAYOUTS:
+        def setup(n=n, w=w, h=h):
+            layout_rng = random.Random(0)
+            return lambda: _check_layout(sample_positions(n, w, h, avoid=[(w // 2, h // 2, 40)], rng=layout_rng), n)
+        cases[f"sample_positions[{n} on {w}x{h}]"] = setup
+
+    for n_buttons in (5, 100):
+        cases[f"vdesktop.move_cursor[{n_buttons} buttons]"] = lambda n=n_buttons: _vdesktop_case(n, "move")
+        cases[f"vdesktop.check_click[{n_buttons} buttons]"] = lambda n=n_buttons: _vdesktop_case(n, "click")
+
+    def predictor_setup():
+        try:
+            from model.inference import CursorPredictor
+        except ImportError as e:
+            raise Skip(f"torch unavailable ({e})")
+        predictor = CursorPredictor(device="cpu")
+        path = os.path.join(tmp, "frame_predict.png")
+        Image.new("RGB", (600, 350), "white").save(path)
+        return lambda: predictor.predict(path)
+    cases["predictor.predict[cpu]"] = predictor_setup
+    return cases
+
+
+def _check_layout(points, n, button_size=(40, 30)):
+    """Fails the run outright if a layout is short of buttons or two buttons overlap."""
+    if len(points) != n:
+        raise AssertionError(f"sample_positions returned {len(points)} of {n} points")
+    for i, (x, y) in enumerate(points):
+        for px, py in points[:i]:
+            if abs(x - px) < button_size[0] and abs(y - py) < button_size[1]:
+                raise AssertionError(f"buttons at {(px, py)} and {(x, y)} overlap")
+
+
+_desktops = {}
+
+
+def _vdesktop_case(num_buttons, op):
+    """
+    VDesktop needs a Tk display; the desktop is created once per button count and reused.
+    Rendering is set to "scene" so no screen capture is involved.
+    """
+    if num_buttons not in _desktops:
+        try:
+            import tkinter as tk
+            from adt.vdesktop import VDesktop
+        except ImportError as e:
+            raise Skip(f"Tk unavailable ({e})")
+        width, height = (600, 350) if num_buttons <= 5 else (1920, 1080)
+        try:
+            app = VDesktop(None, render="scene", width=width, height=height, num_buttons=num_buttons)
+        except tk.TclError as e:
+            raise Skip(f"no Tk display ({e})")
+        app.withdraw()
+        _desktops[num_buttons] = app
+    app = _desktops[num_buttons]
+    if op == "move":
+        directions = ["left", "right", "up", "down"]
+        return lambda: [app.move_cursor(d, 3) for d in directions]
+    return app.check_click
+
+
+def time_case(fn, repeat=5):
+    """
+    Best per-call time in seconds over `repeat` runs of a loop sized to take at least 0.2s.
+    Output of the timed code (VDesktop prints on every click) is discarded.
+    """
+    timer = timeit.Timer(fn)
+    with contextlib.redirect_stdout(io.StringIO()):
+        number, _ = timer.autorange()
+        return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def run(filter_text=None, repeat=5):
+    results, skipped = {}, {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, setup in build_cases(tmp).items():
+            if filter_text and filter_text not in name:
+                continue
+            try:
+                fn = setup()
+            except Skip as e:
+                skipped[name] = str(e)
+                print(f"{name:<40} skipped: {e}")
+                continue
+            results[name] = time_case(fn, repeat)
+            print(f"{name:<40} {results[name] * 1e6:>12.1f} us")
+    return results, skipped
+
+
+def compare(results, baseline, threshold):
+    """
+    Cases slower than baseline * (1 + threshold). Returns [(name, baseline_s, current_s)].
+    Cases missing from either side are not compared.
+    """
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is not None and current > base * (1 + threshold):
+            regressions.append((name, base, current))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the per-request helpers with regression gate")
+    parser.add_argument("--baseline", type=str, default=DEFAULT_BASELINE, help="Baseline JSON to compare against / write")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline instead of comparing")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown before a case counts as a regression (0.25 = 25%%)")
+    parser.add_argument("--filter", type=str, default=None, help="Only run cases whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repeats per case (best is kept)")
+    args = parser.parse_args()
+
+    results, skipped = run(args.filter, args.repeat)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, 'r') as f:
+                baseline = json.load(f).get("cases", {})
+        baseline.update(results)
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump({"machine": platform.node(), "python": platform.python_version(), "cases": baseline},
+                      f, indent=2, sort_keys=True)
+        print(f"Baseline with {len(results)} cases saved to {args.baseline}")
+        sys.exit(0)
+
+    if not os.path.exists(args.baseline):
+        print(f"ERROR: no baseline at {args.baseline}, regression gate not applied; run with --save-baseline first")
+        sys.exit(2)
+    with open(args.baseline, 'r') as f:
+        saved = json.load(f)
+    if saved.get("machine") != platform.node():
+        print(f"Warning: baseline was recorded on {saved.get('machine')!r}, timings may not be comparable")
+
+    regressions = compare(results, saved["cases"], args.threshold)
+    for name, base, current in regressions:
+        print(f"REGRESSION {name}: {base * 1e6:.1f} us -> {current * 1e6:.1f} us ({current / base - 1:+.0%})")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions beyond {args.threshold:.0%} ({len(results)} cases, {len(skipped)} skipped)")
@@ -0,0 +1,142 @@
+import json
+import os
+import numpy as np
+
+# column name -> dtype. Strings are stored as fixed-width unicode so the npz needs no pickling.
+COLUMNS = {
+    "run_id": "U",
+    "test_id": np.int64,
+    "seed": np.int64,
+    "agent": "U",
+    "success": bool,
+    "distance": np.float64,  # NaN when the agent failed
+    "latency": np.float64,   # seconds, NaN when not measured
+    "error": bool,
+    "input_tokens": np.float64,   # NaN when the agent made no model call
+    "output_tokens": np.float64,
+}
+
+
+class ResultsStore:
+    """
+    Columnar benchmark results: one NumPy array per column, one row per (run_id, test_id, seed, agent).
+    Saved as a compressed .npz; stores from several runs can be merged.
+    """
+
+    def __init__(self, columns: dict | None = None):
+        if columns is None:
+            columns = {name: np.array([], dtype=dt if dt != "U" else "U1") for name, dt in COLUMNS.items()}
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns["test_id"])
+
+    def __getitem__(self, name) -> np.ndarray:
+        return self.columns[name]
+
+    @classmethod
+    def from_records(cls, records: list[dict]) -> "ResultsStore":
+        """
+        Build a store from row dicts; missing distance/latency become NaN, missing seed -1.
+        """
+        defaults = {"run_id": "", "test_id": -1, "seed": -1, "agent": "", "success": False,
+                    "distance": np.nan, "latency": np.nan, "error": False,
+                    "input_tokens": np.nan, "output_tokens": np.nan}
+        columns = {}
+        for name, dt in COLUMNS.items():
+            values = [r.get(name, defaults[name]) for r in records]
+            values = [defaults[name] if v is None else v for v in values]
+            columns[name] = np.array(values, dtype=str if dt == "U" else dt)
+        return cls(columns)
+
+    @classmethod
+    def from_json(cls, path: str, run_id: str = "legacy") -> "ResultsStore":
+        """
+        Convert a results.json written by Benchmark.run ({agent: [result, ...]}).
+        Rows without a test_id fall back to their position in the agent's list.
+        """
+        with open(path, 'r') as f:
+            results = json.load(f)
+        records = []
+        for agent, rows in results.items():
+            for i, r in enumerate(rows):
+                records.append({
+                    "run_id": run_id,
+                    "test_id": r.get("test_id", i),
+                    "seed": r.get("seed", -1),
+                    "agent": agent,
+                    "success": bool(r.get("success")),
+                    "distance": r.get("distance"),
+                    "latency": r.get("latency"),
+                    "error": "error" in r,
+                    "input_tokens": r.get("input_tokens"),
+                    "output_tokens": r.get("output_tokens"),
+                })
+        return cls.from_records(records)
+
+    @classmethod
+    def load(cls, path: str) -> "ResultsStore":
+        if path.endswith(".json"):
+            return cls.from_json(path, run_id=os.path.splitext(os.path.basename(path))[0])
+        with np.load(path, allow_pickle=False) as data:
+            n = len(data["test_id"])
+            # columns added after a store was written are filled with NaN
+            return cls({name: data[name] if name in data.files else np.full(n, np.nan)
+                        for name in COLUMNS})
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez_compressed(path, **self.columns)
+
+    @classmethod
+    def merge(cls, stores: list["ResultsStore"]) -> "ResultsStore":
+        """
+        Concatenate stores. If the same (run_id, test_id, seed, agent) appears more than once,
+        the row from the later store wins.
+        """
+        columns = {name: np.concatenate([s.columns[name] for s in stores]) for name in COLUMNS}
+        merged = cls(columns)
+        keys = merged.row_keys(with_agent=True)
+        # keep the last occurrence of each key
+        _, last = np.unique(keys[::-1], axis=0, return_index=True)
+        keep = np.sort(len(keys) - 1 - last)
+        return cls({name: col[keep] for name, col in columns.items()})
+
+    def append(self, other: "ResultsStore") -> "ResultsStore":
+        return ResultsStore.merge([self, other])
+
+    def row_keys(self, with_agent: bool = False) -> np.ndarray:
+        """
+        Integer key columns identifying a test case (run, test, seed), optionally plus agent.
+        Strings are factorized so keys can be compared and sorted as plain int64 rows.
+        """
+        _, run_idx = np.unique(self.columns["run_id"], return_inverse=True)
+        parts = [run_idx, self.columns["test_id"], self.columns["seed"]]
+        if with_agent:
+            _, agent_idx = np.unique(self.columns["agent"], return_inverse=True)
+            parts.append(agent_idx)
+        return np.stack([p.astype(np.int64) for p in parts], axis=1)
+
+    def agents(self) -> list[str]:
+        return [str(a) for a in np.unique(self.columns["agent"])]
+
+    def select(self, mask: np.ndarray) -> "ResultsStore":
+        return ResultsStore({name: col[mask] for name, col in self.columns.items()})
+
+    def paired(self, agent_a: str, agent_b: str, column: str):
+        """
+        Values of `column` for two agents on the test cases both of them completed, aligned by
+        (run_id, test_id, seed). Returns (values_a, values_b).
+        """
+        valid = ~self.columns["error"] & ~np.isnan(self.columns["distance"])
+        keys = self.row_keys()
+        # collapse each (run, test, seed) row to one int so intersect1d can align them
+        _, case_id = np.unique(keys, axis=0, return_inverse=True)
+        case_id = case_id.ravel()
+        out = []
+        for agent in (agent_a, agent_b):
+            mask = valid & (self.columns["agent"] == agent)
+            out.append((case_id[mask], self.columns[column][mask]))
+        (ids_a, vals_a), (ids_b, vals_b) = out
+        _, ia, ib = np.intersect1d(ids_a, ids_b, assume_unique=False, return_indices=True)
+        return vals_a[ia].astype(np.float64), vals_b[ib].astype(np.float64)
@@ -0,0 +1,177 @@
+import argparse
+import csv
+import os
+import statistics
+import time
+
+import torch
+import torch.nn as nn
+from torchvision import transforms
+from PIL import Image
+
+from model.imageshot import build_model, checkpoint_path
+
+# (arch, input_size, separable) configurations compared by default
+DEFAULT_CONFIGS = [
+    ("imageshot", 128, False),
+    ("pooled", 128, False),
+    ("pooled", 128, True),
+    ("pooled", 96, True),
+    ("heatmap", 128, False),
+    ("heatmap", 128, True),
+    ("heatmap", 96, True),
+    ("heatmap", 64, True),
+]
+
+
+def count_params(model: nn.Module) -> int:
+    return sum(p.numel() for p in model.parameters())
+
+
+def count_flops(model: nn.Module, input_size: int, in_channels: int = 3) -> int:
+    """
+    FLOPs of one forward pass at batch size 1, counting conv and linear layers
+    (2 FLOPs per multiply-accumulate). Norms, activations and pooling are ignored.
+    """
+    flops = 0
+
+    def conv_hook(module, inputs, output):
+        nonlocal flops
+        kh, kw = module.kernel_size
+        macs_per_output = (module.in_channels // module.groups) * kh * kw
+        flops += 2 * output.numel() * macs_per_output
+
+    def linear_hook(module, inputs, output):
+        nonlocal flops
+        flops += 2 * output.numel() * module.in_features
+
+    handles = []
+    for m in model.modules():
+        if isinstance(m, nn.Conv2d):
+            handles.append(m.register_forward_hook(conv_hook))
+        elif isinstance(m, nn.Linear):
+            handles.append(m.register_forward_hook(linear_hook))
+
+    model.eval()
+    with torch.no_grad():
+        model(torch.zeros(1, in_channels, input_size, input_size))
+    for h in handles:
+        h.remove()
+    return flops
+
+
+def measure_latency(model: nn.Module, input_size: int, runs: int = 50, warmup: int = 5):
+    """
+    CPU latency of a batch-size-1 forward in milliseconds. Returns (median, p95).
+    """
+    model.eval()
+    x = torch.rand(1, 3, input_size, input_size)
+    timings = []
+    with torch.no_grad():
+        for _ in range(warmup):
+            model(x)
+        for _ in range(runs):
+            start = time.perf_counter()
+            model(x)
+            timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(0.95 * len(timings)))]
+    return statistics.median(timings), p95
+
+
+def pixel_error(model: nn.Module, input_size: int, data_dir: str, max_samples: int = 500):
+    """
+    Mean Euclidean error in pixels between predicted and labeled (dx, dy) on the first
+    max_samples rows of data_dir/labels.csv.
+    """
+    csv_path = os.path.join(data_dir, "labels.csv")
+    with open(csv_path, 'r') as f:
+        rows = list(csv.DictReader(f))[:max_samples]
+
+    transform = transforms.Compose([
+        transforms.Resize((input_size, input_size)),
+        transforms.ToTensor(),
+    ])
+    w, h = 600.0, 350.0
+    errors = []
+    model.eval()
+    with torch.no_grad():
+        for start in range(0, len(rows), 64):
+            batch = rows[start:start + 64]
+            images = torch.stack([
+                transform(Image.open(os.path.join(data_dir, "images", r['filename'])).convert('RGB'))
+                for r in batch
+            ])
+            preds = model(images)
+            targets = torch.tensor([[float(r['dx']) / w, float(r['dy']) / h] for r in batch])
+            diff = (preds - targets) * torch.tensor([w, h])
+            errors.extend(torch.linalg.vector_norm(diff, dim=1).tolist())
+    return sum(errors) / len(errors) if errors else float("nan")
+
+
+def run(configs, data_dir="model/data", threads=1, runs=50, samples=500):
+    torch.set_num_threads(threads)
+    have_data = os.path.exists(os.path.join(data_dir, "labels.csv"))
+    results = []
+
+    for arch, input_size, separable in configs:
+        model = build_model(arch, output_dim=2, input_size=input_size, separable=separable)
+        ckpt = checkpoint_path(arch, input_size, separable)
+
+        err = None
+        if have_data and os.path.exists(ckpt):
+            model.load_state_dict(torch.load(ckpt, map_location="cpu"))
+            err = pixel_error(model, input_size, data_dir, samples)
+
+        median_ms, p95_ms = measure_latency(model, input_size, runs=runs)
+        results.append({
+            "arch": arch,
+            "input_size": input_size,
+            "separable": separable,
+            "params": count_params(model),
+            "mflops": count_flops(model, input_size) / 1e6,
+            "latency_ms": median_ms,
+            "latency_p95_ms": p95_ms,
+            "pixel_error": err,
+        })
+    return results
+
+
+def print_table(results):
+    header = f"{'arch':<10} {'res':>4} {'sep':>4} {'params':>10} {'MFLOPs':>9} {'ms p50':>8} {'ms p95':>8} {'px err':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        err = f"{r['pixel_error']:.2f}" if r['pixel_error'] is not None else "n/a"
+        print(f"{r['arch']:<10} {r['input_size']:>4} {'y' if r['separable'] else 'n':>4} "
+              f"{r['params']:>10,} {r['mflops']:>9.1f} {r['latency_ms']:>8.2f} {r['latency_p95_ms']:>8.2f} {err:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare ImageShot architectures: params, FLOPs, CPU latency, pixel error")
+    parser.add_argument("--arch", type=str, default=None, help="Only benchmark this architecture")
+    parser.add_argument("--input-size", type=int, default=None, help="Only benchmark this input resolution")
+    parser.add_argument("--data", type=str, default="model/data", help="Dataset directory used for pixel error")
+    parser.add_argument("--threads", type=int, default=1, help="torch CPU threads")
+    parser.add_argument("--runs", type=int, default=50, help="Timed forward passes per configuration")
+    parser.add_argument("--samples", type=int, default=500, help="Samples used for pixel error")
+    parser.add_argument("--csv", type=str, default=None, help="Optional path to write results as CSV")
+    args = parser.parse_args()
+
+    configs = [c for c in DEFAULT_CONFIGS
+               if (args.arch is None or c[0] == args.arch)
+               and (args.input_size is None or c[1] == args.input_size)]
+    if not configs and args.arch is not None:
+        configs = [(args.arch, args.input_size or 128, False)]
+
+    results = run(configs, data_dir=args.data, threads=args.threads, runs=args.runs, samples=args.samples)
+    print_table(results)
+    print("\nPixel error is n/a for configurations without a trained checkpoint "
+          "(train with: python -m model.training --arch ARCH --input-size N [--separable]).")
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+            writer.writeheader()
+            writer.writerows(results)
+        print(f"Results saved to {args.csv}")
@@ -6,14 +6,16 @@ from PIL import Image, ImageDraw
 
 import shutil
 
+from adt.layout import BUTTON_COLORS, MIN_DIST, sample_positions
+
 def generate_data(num_samples=10000, output_dir="model/data"):
     images_dir = os.path.join(output_dir, "images")
     os.makedirs(images_dir, exist_ok=True)
     csv_path = os.path.join(output_dir, "labels.csv")
 
     w, h = 600, 350
-    colors = ["green", "red", "orange", "blue", "purple"]
-    min_dist = 80
+    colors = BUTTON_COLORS
+    min_dist = MIN_DIST
 
     with open(csv_path, 'w', newline='') as csvfile:
         fieldnames = ['filename', 'target_color', 'cursor_x', 'cursor_y', 'target_x', 'target_y', 'dx', 'dy', 'distance']
@@ -32,36 +34,24 @@ def generate_data(num_samples=10000, output_dir="model/data"):
             cy = random.randint(20, h - 20)
             draw.rectangle([cx-6, cy-6, cx+6, cy+6], fill="black")
 
-            positions = []
             # target_color = random.choice(colors)
             target_color = "red" # Fixed target for single-task learning
             target_center = None
 
-            # Draw buttons
-            for color in colors:
-                # Try to find a spot
-                for _ in range(100):
-                    x = random.randint(min_dist, w - min_dist)
-                    y = random.randint(min_dist, h - min_dist)
-                    
-                    # Check overlap with other buttons
-                    if all(math.hypot(x - x2, y - y2) > min_dist for x2, y2 in positions):
-                        # Check overlap with cursor (don't spawn on top of cursor)
-                        if math.hypot(x - cx, y - cy) > 40: 
-                            positions.append((x, y))
-                            
-                            # Draw button (centered at x,y, size 40x30)
-                            x1, y1 = x - 20, y - 15
-                            x2, y2 = x + 20, y + 15
-                            draw.rectangle([x1, y1, x2, y2], fill=color, outline="black")
-                            
-                            if color == target_color:
-                                target_center = (x, y)
-                            break
-            
-            if target_center is None:
-                # Should rarely happen with these constraints, but just in case retry or skip
+            # Draw buttons, not spawning on top of the cursor
+            try:
+                positions = sample_positions(len(colors), w, h, min_dist=min_dist, avoid=[(cx, cy, 40)])
+            except ValueError:
+                # Should rarely happen with these constraints, but just in case skip
                 continue
+            for color, (x, y) in zip(colors, positions):
+                # Draw button (centered at x,y, size 40x30)
+                x1, y1 = x - 20, y - 15
+                x2, y2 = x + 20, y + 15
+                draw.rectangle([x1, y1, x2, y2], fill=color, outline="black")
+
+                if color == target_color:
+                    target_center = (x, y)
 
             tx, ty = target_center
             dx = tx - cx
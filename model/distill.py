@@ -0,0 +1,193 @@
+import argparse
+import csv
+import math
+import os
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+from adt.locator import parse_target_color
+from adt.trace import read_trace
+from adt.utility import actions_to_dxdy
+from model.imageshot import build_model, checkpoint_path
+from model.training import CursorDataset, fit, make_loaders, make_transform, save_checkpoint
+
+FIELDNAMES = ['filename', 'target_color', 'cursor_x', 'cursor_y', 'target_x', 'target_y', 'dx', 'dy', 'distance']
+# CursorDataset normalizes by the default canvas size, so only frames of that canvas are usable.
+# VDesktop captures the whole window; the canvas is its top-left CANVAS region.
+CANVAS = (600, 350)
+# ImageShot takes no instruction and is trained to find the red button (model.datageneration)
+TARGET_COLOR = "red"
+
+
+def successful_prefix(actions: list[str], clicks: list, target: str | None):
+    """
+    Actions up to and including the first click that hit `target`, or None if no click did.
+    clicks holds one result (color or None) per click action, in order.
+    """
+    if target is None:
+        return None
+    k = 0
+    for i, action in enumerate(actions):
+        if action.split()[:1] == ["click"]:
+            if k < len(clicks) and clicks[k] == target:
+                return actions[:i + 1]
+            k += 1
+    return None
+
+
+class DistillShard:
+    """
+    Training shard of Gemini commands that clicked their target, in the layout CursorDataset
+    reads: <dir>/images/*.png and <dir>/labels.csv. Opening an existing shard appends to it.
+    """
+
+    def __init__(self, shard_dir: str):
+        self.dir = shard_dir
+        self.images_dir = os.path.join(shard_dir, "images")
+        self.csv_path = os.path.join(shard_dir, "labels.csv")
+        os.makedirs(self.images_dir, exist_ok=True)
+        self.count = 0
+        if os.path.exists(self.csv_path):
+            with open(self.csv_path, 'r') as f:
+                self.count = sum(1 for _ in csv.DictReader(f))
+        self.skipped = {"color": 0, "no_hit": 0, "canvas": 0}
+
+    def add(self, frame, instruction: str, actions: list[str], clicks: list, scene=None) -> bool:
+        """
+        Store one command if it clicked the color named in the instruction and that color is
+        TARGET_COLOR. The label is the cursor displacement of the actions up to that click.
+        Returns whether it was stored.
+        """
+        color = parse_target_color(instruction)
+        if color != TARGET_COLOR:
+            self.skipped["color"] += 1
+            return False
+        prefix = successful_prefix(actions, clicks, color)
+        if prefix is None:
+            self.skipped["no_hit"] += 1
+            return False
+        if scene is not None and (scene.width, scene.height) != CANVAS:
+            self.skipped["canvas"] += 1
+            return False
+
+        if not isinstance(frame, Image.Image):
+            frame = Image.fromarray(np.asarray(frame, dtype=np.uint8))
+        if frame.width < CANVAS[0] or frame.height < CANVAS[1]:
+            self.skipped["canvas"] += 1
+            return False
+        # images and labels must share the canvas coordinate frame the labels are normalized by
+        frame = frame.crop((0, 0) + CANVAS)
+
+        dx, dy = actions_to_dxdy(prefix)
+        cx, cy = scene.cursor if scene is not None else (math.nan, math.nan)
+        filename = f"distill_{self.count:06d}.png"
+        frame.convert("RGB").save(os.path.join(self.images_dir, filename))
+
+        new = not os.path.exists(self.csv_path)
+        with open(self.csv_path, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+            if new:
+                writer.writeheader()
+            writer.writerow({
+                'filename': filename,
+                'target_color': color,
+                'cursor_x': cx,
+                'cursor_y': cy,
+                'target_x': cx + dx,
+                'target_y': cy + dy,
+                'dx': dx,
+                'dy': dy,
+                'distance': math.hypot(dx, dy),
+            })
+        self.count += 1
+        return True
+
+
+def shard_from_trace(trace_path: str, shard_dir: str) -> DistillShard:
+    """
+    Add every Gemini-answered, successful command of a VDesktop trace to a shard.
+    Entries without a raw response were answered locally and are not distilled.
+    """
+    from adt.scene import Scene
+    shard = DistillShard(shard_dir)
+    added = 0
+    for meta, frame in read_trace(trace_path):
+        if meta.get("raw_response") is None:
+            continue
+        scene = Scene.from_dict(meta["scene"]) if meta.get("scene") else None
+        added += shard.add(frame, meta["instruction"], meta["actions"], meta.get("after", {}).get("clicks", []), scene)
+    print(f"Added {added} samples from {trace_path} to {shard_dir} ({shard.count} total, skipped {shard.skipped})")
+    return shard
+
+
+def finetune(shard_dirs: list[str], base_checkpoint: str | None = None, output_path: str | None = None,
+             arch="imageshot", input_size=128, separable=False, hidden_channels=32,
+             synthetic_dir: str | None = None, synthetic_samples: int = 0,
+             batch_size=32, learning_rate=1e-5, num_epochs=10, seed=0):
+    """
+    Continue training an ImageShot checkpoint on distilled shards with the model.training loop.
+    synthetic_samples > 0 mixes in that many random samples from synthetic_dir (the generated
+    dataset) so the model does not forget the synthetic distribution.
+    """
+    transform = make_transform(input_size)
+    datasets = [CursorDataset(os.path.join(d, "labels.csv"), os.path.join(d, "images"), transform=transform)
+                for d in shard_dirs]
+    generator = torch.Generator().manual_seed(seed)
+    if synthetic_dir and synthetic_samples:
+        synthetic = CursorDataset(os.path.join(synthetic_dir, "labels.csv"), os.path.join(synthetic_dir, "images"),
+                                  transform=transform)
+        idx = torch.randperm(len(synthetic), generator=generator)[:synthetic_samples].tolist()
+        datasets.append(torch.utils.data.Subset(synthetic, idx))
+    dataset = torch.utils.data.ConcatDataset(datasets)
+    print(f"Fine-tuning on {len(dataset)} samples from {len(datasets)} sources")
+    train_loader, val_loader = make_loaders(dataset, batch_size, generator=generator)
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model = build_model(arch, output_dim=2, input_size=input_size,
+                        separable=separable, hidden_channels=hidden_channels).to(device)
+    if base_checkpoint is None:
+        base_checkpoint = checkpoint_path(arch, input_size, separable, hidden_channels)
+    if os.path.exists(base_checkpoint):
+        model.load_state_dict(torch.load(base_checkpoint, map_location=device))
+    else:
+        print(f"Warning: base checkpoint {base_checkpoint} not found, training from scratch")
+
+    history = fit(model, train_loader, val_loader, device, num_epochs, learning_rate)
+    if output_path is None:
+        stem, ext = os.path.splitext(checkpoint_path(arch, input_size, separable, hidden_channels))
+        output_path = f"{stem}_distill_{time.strftime('%Y%m%d-%H%M%S')}{ext}"
+    save_checkpoint(model, output_path)
+    return history
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distill logged Gemini commands into ImageShot")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("from-trace", help="Build or extend a shard from VDesktop traces")
+    p.add_argument("traces", nargs="+", help="Trace files written with --trace")
+    p.add_argument("--shard", type=str, default="model/data/distill", help="Shard directory")
+
+    p = sub.add_parser("finetune", help="Fine-tune an ImageShot checkpoint on shards")
+    p.add_argument("shards", nargs="+", help="Shard directories")
+    p.add_argument("--base", type=str, default=None, help="Checkpoint to start from (default for the configuration)")
+    p.add_argument("--output", type=str, default=None, help="Where to save the fine-tuned checkpoint")
+    p.add_argument("--arch", type=str, default="imageshot", help="Model architecture")
+    p.add_argument("--input-size", type=int, default=128, help="Input resolution")
+    p.add_argument("--separable", action="store_true", help="Use depthwise-separable convolutions")
+    p.add_argument("--synthetic", type=str, default="model/data", help="Generated dataset to mix in")
+    p.add_argument("--synthetic-samples", type=int, default=0, help="How many synthetic samples to mix in")
+    p.add_argument("--lr", type=float, default=1e-5, help="Learning rate")
+    p.add_argument("--epochs", type=int, default=10, help="Number of epochs")
+    args = parser.parse_args()
+
+    if args.command == "from-trace":
+        for trace in args.traces:
+            shard_from_trace(trace, args.shard)
+    else:
+        finetune(args.shards, args.base, args.output, arch=args.arch, input_size=args.input_size,
+                 separable=args.separable, synthetic_dir=args.synthetic, synthetic_samples=args.synthetic_samples,
+                 learning_rate=args.lr, num_epochs=args.epochs)
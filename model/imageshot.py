@@ -1,8 +1,70 @@
+import os
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
 
+def _conv_block(in_channels: int, out_channels: int, separable: bool = False) -> list[nn.Module]:
+    """
+    Conv(3x3) -> BN -> ReLU -> MaxPool(2).
+    With separable=True the 3x3 conv is split into a depthwise 3x3 and a pointwise 1x1,
+    which cuts the block cost by roughly a factor of out_channels / 9 + 1.
+    """
+    if separable:
+        layers = [
+            nn.Conv2d(in_channels, in_channels, kernel_size=3, padding=1, groups=in_channels, bias=False),
+            nn.BatchNorm2d(in_channels),
+            nn.ReLU(inplace=True),
+            nn.Conv2d(in_channels, out_channels, kernel_size=1, bias=False),
+        ]
+    else:
+        layers = [nn.Conv2d(in_channels, out_channels, kernel_size=3, padding=1, bias=False)]
+    layers += [
+        nn.BatchNorm2d(out_channels),
+        nn.ReLU(inplace=True),
+        nn.MaxPool2d(2),
+    ]
+    return layers
+
+
+def _backbone(in_channels: int, hidden_channels: int, num_blocks: int = 4, separable: bool = False) -> nn.Sequential:
+    """
+    Stack of conv blocks doubling the channels and halving the resolution each time.
+    The first block always uses a dense conv since a depthwise conv over 3 channels buys nothing.
+    """
+    layers = []
+    channels = in_channels
+    for i in range(num_blocks):
+        out = hidden_channels * (2 ** i)
+        layers += _conv_block(channels, out, separable=separable and i > 0)
+        channels = out
+    return nn.Sequential(*layers)
+
+
+def _coord_grid(x: torch.Tensor) -> torch.Tensor:
+    """
+    Returns two (N, 1, H, W) channels holding the normalized x and y position of each pixel in [-1, 1].
+    """
+    n, _, h, w = x.shape
+    ys = torch.linspace(-1.0, 1.0, h, device=x.device, dtype=x.dtype).view(1, 1, h, 1).expand(n, 1, h, w)
+    xs = torch.linspace(-1.0, 1.0, w, device=x.device, dtype=x.dtype).view(1, 1, 1, w).expand(n, 1, h, w)
+    return torch.cat([xs, ys], dim=1)
+
+
+def soft_argmax(heatmaps: torch.Tensor) -> torch.Tensor:
+    """
+    Differentiable argmax over each heatmap.
+    Input: (N, K, H, W) logits. Output: (N, K, 2) expected (x, y) positions in [0, 1] image fractions.
+    """
+    n, k, h, w = heatmaps.shape
+    probs = F.softmax(heatmaps.flatten(2), dim=-1).view(n, k, h, w)
+    xs = (torch.arange(w, device=heatmaps.device, dtype=heatmaps.dtype) + 0.5) / w
+    ys = (torch.arange(h, device=heatmaps.device, dtype=heatmaps.dtype) + 0.5) / h
+    x = (probs.sum(dim=2) * xs).sum(dim=-1)
+    y = (probs.sum(dim=3) * ys).sum(dim=-1)
+    return torch.stack([x, y], dim=-1)
+
+
 class ImageShotModel(nn.Module):
     """
     Simple CNN:
@@ -10,38 +72,17 @@ class ImageShotModel(nn.Module):
     Expects input: (N, C, H, W)
     """
 
-    def __init__(self, in_channels: int = 3, output_dim: int = 2, hidden_channels: int = 32):
+    def __init__(self, in_channels: int = 3, output_dim: int = 2, hidden_channels: int = 32,
+                 input_size: int = 128, separable: bool = False):
         super().__init__()
 
-        self.features = nn.Sequential(
-            # Block 1: 128x128 -> 64x64
-            nn.Conv2d(in_channels, hidden_channels, kernel_size=3, padding=1, bias=False),
-            nn.BatchNorm2d(hidden_channels),
-            nn.ReLU(inplace=True),
-            nn.MaxPool2d(2),
-            
-            # Block 2: 64x64 -> 32x32
-            nn.Conv2d(hidden_channels, hidden_channels * 2, kernel_size=3, padding=1, bias=False),
-            nn.BatchNorm2d(hidden_channels * 2),
-            nn.ReLU(inplace=True),
-            nn.MaxPool2d(2),
-            
-            # Block 3: 32x32 -> 16x16
-            nn.Conv2d(hidden_channels * 2, hidden_channels * 4, kernel_size=3, padding=1, bias=False),
-            nn.BatchNorm2d(hidden_channels * 4),
-            nn.ReLU(inplace=True),
-            nn.MaxPool2d(2),
-            
-            # Block 4: 16x16 -> 8x8
-            nn.Conv2d(hidden_channels * 4, hidden_channels * 8, kernel_size=3, padding=1, bias=False),
-            nn.BatchNorm2d(hidden_channels * 8),
-            nn.ReLU(inplace=True),
-            nn.MaxPool2d(2),
-        )
+        # 4 blocks, each halving the resolution: 128x128 -> 64 -> 32 -> 16 -> 8x8
+        self.features = _backbone(in_channels, hidden_channels, num_blocks=4, separable=separable)
 
         # Flatten: 8 * 8 * (hidden_channels * 8) = 64 * 256 = 16384
-        self.flatten_dim = (hidden_channels * 8) * 8 * 8
-        
+        spatial = input_size // 16
+        self.flatten_dim = (hidden_channels * 8) * spatial * spatial
+
         self.regressor = nn.Sequential(
             nn.Linear(self.flatten_dim, 512),
             nn.ReLU(inplace=True),
@@ -53,4 +94,89 @@ class ImageShotModel(nn.Module):
         x = self.features(x)
         x = torch.flatten(x, 1)
         out = self.regressor(x)
-        return out
\ No newline at end of file
+        return out
+
+
+class PooledShotModel(nn.Module):
+    """
+    Same backbone as ImageShotModel but with a global-average-pooled head, so the head size
+    no longer depends on the input resolution.
+    Two coordinate channels are appended to the input (CoordConv) so the pooled features
+    still carry absolute position information.
+    """
+
+    def __init__(self, in_channels: int = 3, output_dim: int = 2, hidden_channels: int = 32,
+                 input_size: int = 128, separable: bool = False):
+        super().__init__()
+        self.features = _backbone(in_channels + 2, hidden_channels, num_blocks=4, separable=separable)
+        self.pool = nn.AdaptiveAvgPool2d(1)
+        self.regressor = nn.Sequential(
+            nn.Linear(hidden_channels * 8, 128),
+            nn.ReLU(inplace=True),
+            nn.Dropout(0.2),
+            nn.Linear(128, output_dim)
+        )
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        x = torch.cat([x, _coord_grid(x)], dim=1)
+        x = self.features(x)
+        x = torch.flatten(self.pool(x), 1)
+        return self.regressor(x)
+
+
+class HeatmapShotModel(nn.Module):
+    """
+    Coordinate-regression head: predicts one heatmap for the cursor and one for the target
+    at 1/8 of the input resolution, takes the soft-argmax of each and returns target - cursor.
+    Since dataset targets are dx / 600 and dy / 350, the difference of the two positions
+    (as image fractions) is already in the training target's units.
+    """
+
+    def __init__(self, in_channels: int = 3, output_dim: int = 2, hidden_channels: int = 32,
+                 input_size: int = 128, separable: bool = False):
+        super().__init__()
+        if output_dim != 2:
+            raise ValueError("HeatmapShotModel only supports output_dim=2")
+        self.features = _backbone(in_channels, hidden_channels, num_blocks=3, separable=separable)
+        self.heatmaps = nn.Conv2d(hidden_channels * 4, 2, kernel_size=1)
+
+    def locate(self, x: torch.Tensor) -> torch.Tensor:
+        """
+        Returns (N, 2, 2): [cursor (x, y), target (x, y)] as fractions of the image size.
+        """
+        return soft_argmax(self.heatmaps(self.features(x)))
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        points = self.locate(x)
+        return points[:, 1] - points[:, 0]
+
+
+ARCHITECTURES = {
+    "imageshot": ImageShotModel,
+    "pooled": PooledShotModel,
+    "heatmap": HeatmapShotModel,
+}
+
+
+def build_model(arch: str = "imageshot", **kwargs) -> nn.Module:
+    """
+    Instantiate one of ARCHITECTURES. kwargs are passed to the model constructor
+    (in_channels, output_dim, hidden_channels, input_size, separable).
+    """
+    if arch not in ARCHITECTURES:
+        raise ValueError(f"Unknown architecture {arch!r}, expected one of {sorted(ARCHITECTURES)}")
+    return ARCHITECTURES[arch](**kwargs)
+
+
+def checkpoint_path(arch: str = "imageshot", input_size: int = 128, separable: bool = False,
+                    hidden_channels: int = 32, checkpoint_dir: str = "model/checkpoints") -> str:
+    """
+    Default checkpoint location for a configuration. The original model keeps its historical name;
+    hidden_channels only appears in the name when it differs from the default 32.
+    """
+    if arch == "imageshot" and input_size == 128 and not separable and hidden_channels == 32:
+        return os.path.join(checkpoint_dir, "imageshot_model.pth")
+    suffix = "_sep" if separable else ""
+    if hidden_channels != 32:
+        suffix += f"_h{hidden_channels}"
+    return os.path.join(checkpoint_dir, f"{arch}_{input_size}{suffix}.pth")
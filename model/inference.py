@@ -1,53 +1,234 @@
 import torch
 import argparse
 import os
+import pickle
+import threading
 from torchvision import transforms
 from PIL import Image
-from model.imageshot import ImageShotModel
+from model.imageshot import build_model
+
+def load_state_dict(model_path, device):
+    """
+    Loads a checkpoint's state dict. On CPU the file is memory-mapped (torch >= 2.1, zipfile
+    checkpoints) so the weights are backed by the page cache and shared by every process that
+    maps the same file; older torch versions and legacy checkpoints fall back to a full read.
+    Returns (state_dict, mmapped).
+    """
+    if torch.device(device).type == "cpu":
+        try:
+            return torch.load(model_path, map_location=device, mmap=True, weights_only=True), True
+        except (TypeError, RuntimeError, pickle.UnpicklingError) as e:
+            print(f"Memory-mapped load of {model_path} unavailable ({e}), reading it fully")
+    return torch.load(model_path, map_location=device), False
+
+
+class _Entry:
+    """A loaded model plus what is needed to use it safely from several predictors."""
+
+    def __init__(self, model, mtime):
+        self.model = model
+        self.mtime = mtime
+        self.version = 1
+        self.dropout = [m for m in model.modules() if isinstance(m, torch.nn.Dropout)]
+        # MC-dropout flips dropout layers into train mode; don't let a plain predict run meanwhile
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded models. Every CursorPredictor asking for the same checkpoint
+    and configuration gets the same model instance, loaded once.
+
+    Weights are read-only: they are memory-mapped where possible, otherwise moved to shared
+    memory, so forked workers (and workers receiving the model through torch.multiprocessing)
+    don't each hold a private copy. Each model runs warmup_batch zero images at load so the
+    first real request doesn't pay for allocator and kernel setup.
+    reload() swaps in a newer checkpoint in place; predictors pick it up on their next call.
+    """
+
+    def __init__(self, warmup_batch=1):
+        self.warmup_batch = warmup_batch
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def _load(self, key):
+        model_path, device, arch, input_size, separable, hidden_channels = key
+        print(f"Loading model from {model_path} on {device}...")
+        model = build_model(arch, output_dim=2, input_size=input_size,
+                            separable=separable, hidden_channels=hidden_channels)
+        mtime = None
+        if os.path.exists(model_path):
+            mtime = os.path.getmtime(model_path)
+            state_dict, mmapped = load_state_dict(model_path, device)
+            if mmapped:
+                # keep the parameters as views of the mapped file instead of copying them in
+                model.load_state_dict(state_dict, assign=True)
+            else:
+                model.load_state_dict(state_dict)
+        else:
+            mmapped = False
+            print(f"Warning: Model checkpoint not found at {model_path}. Using random weights.")
+        model = model.to(device)
+        # eval mode either way, so batch norm never mixes statistics across batched requests
+        model.eval()
+        model.requires_grad_(False)
+        if torch.device(device).type == "cpu" and not mmapped:
+            model.share_memory()
+
+        if self.warmup_batch:
+            with torch.no_grad():
+                model(torch.zeros(self.warmup_batch, 3, input_size, input_size, device=device))
+        return model, mtime
+
+    def get(self, model_path, device, arch="imageshot", input_size=128, separable=False, hidden_channels=32) -> _Entry:
+        key = (model_path, str(device), arch, input_size, separable, hidden_channels)
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = _Entry(*self._load(key))
+            return self.entries[key]
+
+    def reload(self, model_path=None, force=False) -> int:
+        """
+        Reload models whose checkpoint file changed since it was loaded (all of them with force),
+        optionally only those loaded from model_path. The new model is built before it replaces
+        the old one, so predictions keep being served meanwhile; if the checkpoint is missing or
+        fails to load the old model stays. Returns how many were reloaded.
+        """
+        with self.lock:
+            items = list(self.entries.items())
+        reloaded = 0
+        for key, entry in items:
+            path = key[0]
+            if model_path is not None and os.path.abspath(path) != os.path.abspath(model_path):
+                continue
+            if not os.path.exists(path):
+                # never trade trained weights for the random ones _load falls back to
+                print(f"Checkpoint {path} is missing; keeping version {entry.version}")
+                continue
+            if not force and os.path.getmtime(path) == entry.mtime:
+                continue
+            try:
+                model, mtime = self._load(key)
+            except Exception as e:
+                # e.g. a checkpoint still being written by a trainer without atomic saves
+                print(f"Reload of {path} failed ({e}); keeping version {entry.version}")
+                continue
+            if mtime is None:
+                print(f"Checkpoint {path} disappeared while reloading; keeping version {entry.version}")
+                continue
+            with entry.lock:
+                entry.model = model
+                entry.mtime = mtime
+                entry.dropout = [m for m in model.modules() if isinstance(m, torch.nn.Dropout)]
+                entry.version += 1
+            print(f"Reloaded {path} (version {entry.version})")
+            reloaded += 1
+        return reloaded
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+REGISTRY = ModelRegistry()
+
 
 class CursorPredictor:
-    def __init__(self, model_path="model/checkpoints/imageshot_model.pth", device=None):
+    def __init__(self, model_path="model/checkpoints/imageshot_model.pth", device=None,
+                 arch="imageshot", input_size=128, separable=False, hidden_channels=32, registry=None):
+        """
+        registry: ModelRegistry the model comes from; the process-wide REGISTRY by default,
+        so predictors with the same checkpoint and configuration share one model.
+        """
         if device is None:
             self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         else:
             self.device = device
-            
-        print(f"Loading model from {model_path} on {self.device}...")
-        self.model = ImageShotModel(output_dim=2).to(self.device)
-        
-        if os.path.exists(model_path):
-            self.model.load_state_dict(torch.load(model_path, map_location=self.device))
-            self.model.eval()
-        else:
-            print(f"Warning: Model checkpoint not found at {model_path}. Using random weights.")
+        self.input_size = input_size
+        self.registry = registry or REGISTRY
+        self.entry = self.registry.get(model_path, self.device, arch, input_size, separable, hidden_channels)
 
         self.transform = transforms.Compose([
-            transforms.Resize((128, 128)),
+            transforms.Resize((input_size, input_size)),
             transforms.ToTensor(),
         ])
 
+    @property
+    def model(self):
+        return self.entry.model
+
+    def reload(self) -> int:
+        """Pick up changed checkpoints in this predictor's registry; see ModelRegistry.reload."""
+        return self.registry.reload()
+
+    def preprocess(self, image_path):
+        """
+        Loads an image and returns the (C, H, W) input tensor the model expects.
+        """
+        image = Image.open(image_path).convert('RGB')
+        return self.transform(image)
+
+    def predict_batch(self, images):
+        """
+        Predicts (dx, dy) for a (N, C, H, W) batch of preprocessed images.
+        Returns a list of N (dx, dy) tuples in pixels.
+        """
+        with self.entry.lock, torch.no_grad():
+            output = self.entry.model(images.to(self.device)).cpu().numpy()
+
+        # Denormalize
+        w, h = 600.0, 350.0
+        return [(dx_norm * w, dy_norm * h) for dx_norm, dy_norm in output]
+
+    def predict_batch_with_uncertainty(self, images, samples=16):
+        """
+        MC-dropout: runs each of the N images `samples` times with the regressor's dropout active
+        (batch norm stays in eval mode), as one (N * samples) batch.
+        Returns a list of N (dx, dy, std) tuples in pixels, where (dx, dy) is the mean prediction
+        and std the spread of the samples, sqrt(std_x^2 + std_y^2).
+        """
+        entry = self.entry
+        n = images.shape[0]
+        repeated = images.to(self.device).repeat_interleave(samples, dim=0)
+        with entry.lock, torch.no_grad():
+            if not entry.dropout:
+                raise ValueError(f"{type(entry.model).__name__} has no dropout layers to sample")
+            for m in entry.dropout:
+                m.train()
+            try:
+                output = entry.model(repeated).view(n, samples, -1)
+            finally:
+                for m in entry.dropout:
+                    m.eval()
+
+        scale = torch.tensor([600.0, 350.0], device=output.device)
+        output = output * scale
+        mean = output.mean(dim=1).cpu().numpy()
+        std = output.std(dim=1).norm(dim=-1).cpu().numpy()
+        return [(dx, dy, s) for (dx, dy), s in zip(mean, std)]
+
+    def predict_with_uncertainty(self, image_path, samples=16):
+        """
+        Predicts (dx, dy, std) for the given image, see predict_batch_with_uncertainty.
+        """
+        image_tensor = self.preprocess(image_path).unsqueeze(0)
+        return self.predict_batch_with_uncertainty(image_tensor, samples)[0]
+
     def predict(self, image_path):
         """
         Predicts (dx, dy) for the given image.
         """
-        image = Image.open(image_path).convert('RGB')
-        image_tensor = self.transform(image).unsqueeze(0).to(self.device) # Add batch dimension
-
-        with torch.no_grad():
-            output = self.model(image_tensor)
-            dx_norm, dy_norm = output[0].cpu().numpy()
-            
-            # Denormalize
-            w, h = 600.0, 350.0
-            dx = dx_norm * w
-            dy = dy_norm * h
-            
-        return dx, dy
+        image_tensor = self.preprocess(image_path).unsqueeze(0) # Add batch dimension
+        return self.predict_batch(image_tensor)[0]
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Inference for Cursor Movement Prediction")
     parser.add_argument("image_path", type=str, help="Path to the input image")
     parser.add_argument("--model", type=str, default="model/checkpoints/imageshot_model.pth", help="Path to model checkpoint")
+    parser.add_argument("--arch", type=str, default="imageshot", help="Model architecture (see model.imageshot.ARCHITECTURES)")
+    parser.add_argument("--input-size", type=int, default=128, help="Input resolution the model was trained at")
+    parser.add_argument("--separable", action="store_true", help="Use depthwise-separable convolutions")
+    parser.add_argument("--uncertainty", type=int, default=0, help="Also report the MC-dropout spread over this many samples")
     
     args = parser.parse_args()
     
@@ -55,9 +236,15 @@ if __name__ == "__main__":
         print(f"Error: Image not found at {args.image_path}")
         exit(1)
 
-    predictor = CursorPredictor(model_path=args.model)
-    dx, dy = predictor.predict(args.image_path)
+    predictor = CursorPredictor(model_path=args.model, arch=args.arch,
+                                input_size=args.input_size, separable=args.separable)
+    if args.uncertainty:
+        dx, dy, std = predictor.predict_with_uncertainty(args.image_path, args.uncertainty)
+    else:
+        dx, dy = predictor.predict(args.image_path)
     
     print(f"Predicted Movement:")
     print(f"dx: {dx:.4f}")
     print(f"dy: {dy:.4f}")
+    if args.uncertainty:
+        print(f"std: {std:.4f}")
@@ -0,0 +1,218 @@
+import argparse
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import torch
+from PIL import Image
+
+from model.inference import CursorPredictor, ModelRegistry
+
+DEFAULT_SOCKET = "/tmp/adt_inference.sock"
+
+
+class _Request:
+    def __init__(self, pixels: np.ndarray):
+        self.pixels = pixels  # (H, W, 3) uint8 view into the client's shared memory
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class InferenceServer:
+    """
+    Serves one warm CursorPredictor to many clients over a Unix socket.
+
+    Each client owns a shared-memory buffer of input_size x input_size x 3 uint8 pixels and sends a
+    short JSON line per request; the server reads the pixels in place. Requests arriving from
+    different clients within max_wait_ms of each other are run as one batch of up to max_batch.
+
+    Protocol (newline-delimited JSON):
+        -> {"op": "hello"}                   <- {"input_size": 128}
+        -> {"op": "predict", "shm": name}    <- {"dx": float, "dy": float} or {"error": str}
+        -> {"op": "reload"}                  <- {"reloaded": int}   (pick up a changed checkpoint)
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, max_batch=32, max_wait_ms=5.0, **predictor_kwargs):
+        self.socket_path = socket_path
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        # warm up at the largest batch size so the first full batch doesn't pay for allocation
+        self.registry = ModelRegistry(warmup_batch=max_batch)
+        self.predictor = CursorPredictor(registry=self.registry, **predictor_kwargs)
+        self.input_size = self.predictor.input_size
+        self.requests = queue.Queue()
+        self.running = False
+        self.num_requests = 0
+        self.num_batches = 0
+
+    def _batch_loop(self):
+        while self.running:
+            try:
+                first = self.requests.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            batch = [first]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                # same conversion as transforms.ToTensor: HWC uint8 -> CHW float in [0, 1]
+                pixels = torch.from_numpy(np.stack([r.pixels for r in batch]))
+                images = pixels.permute(0, 3, 1, 2).float().div_(255.0)
+                results = self.predictor.predict_batch(images)
+                for r, res in zip(batch, results):
+                    r.result = res
+            except Exception as e:
+                for r in batch:
+                    r.error = str(e)
+            for r in batch:
+                r.pixels = None  # release the shared-memory view before the client can detach
+                r.done.set()
+            self.num_requests += len(batch)
+            self.num_batches += 1
+
+    def _attach(self, name: str, attached: dict) -> np.ndarray:
+        if name not in attached:
+            shm = shared_memory.SharedMemory(name=name)
+            # the client owns the segment; stop our resource tracker from unlinking it at exit
+            resource_tracker.unregister(shm._name, "shared_memory")
+            view = np.ndarray((self.input_size, self.input_size, 3), dtype=np.uint8, buffer=shm.buf)
+            attached[name] = (shm, view)
+        return attached[name][1]
+
+    def _handle(self, conn: socket.socket):
+        attached = {}
+        stream = conn.makefile("rwb")
+        try:
+            for line in stream:
+                msg = json.loads(line)
+                if msg.get("op") == "hello":
+                    reply = {"input_size": self.input_size}
+                elif msg.get("op") == "predict":
+                    try:
+                        pixels = self._attach(msg["shm"], attached)
+                    except (KeyError, OSError, TypeError, ValueError) as e:
+                        # missing, stale or undersized segment: answer this message, keep the connection
+                        pixels, reply = None, {"error": f"cannot attach shared memory {msg.get('shm')!r}: {e}"}
+                    if pixels is not None:
+                        req = _Request(pixels)
+                        self.requests.put(req)
+                        req.done.wait()
+                        if req.error is not None:
+                            reply = {"error": req.error}
+                        else:
+                            reply = {"dx": float(req.result[0]), "dy": float(req.result[1])}
+                elif msg.get("op") == "reload":
+                    reply = {"reloaded": self.registry.reload()}
+                else:
+                    reply = {"error": f"unknown op {msg.get('op')!r}"}
+                stream.write((json.dumps(reply) + "\n").encode())
+                stream.flush()
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            # drop the numpy views before closing, or the buffers are still exported
+            for name in list(attached):
+                shm = attached.pop(name)[0]
+                shm.close()
+            stream.close()
+            conn.close()
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        server.listen(128)
+        self.running = True
+        batcher = threading.Thread(target=self._batch_loop, daemon=True)
+        batcher.start()
+        print(f"Inference server listening on {self.socket_path} "
+              f"(max batch {self.max_batch}, max wait {self.max_wait * 1000:.1f} ms)")
+        try:
+            while True:
+                conn, _ = server.accept()
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.running = False
+            server.close()
+            os.unlink(self.socket_path)
+            if self.num_batches:
+                print(f"Served {self.num_requests} requests in {self.num_batches} batches "
+                      f"(avg batch {self.num_requests / self.num_batches:.1f})")
+
+
+class InferenceClient:
+    """
+    Drop-in replacement for CursorPredictor that forwards predictions to an InferenceServer.
+    Resizes frames locally and writes them into a shared-memory buffer, so only a short
+    JSON message crosses the socket.
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path)
+        self.stream = self.sock.makefile("rwb")
+        self.input_size = self._call({"op": "hello"})["input_size"]
+        self.shm = shared_memory.SharedMemory(create=True, size=self.input_size * self.input_size * 3)
+        self.pixels = np.ndarray((self.input_size, self.input_size, 3), dtype=np.uint8, buffer=self.shm.buf)
+
+    def _call(self, msg: dict) -> dict:
+        self.stream.write((json.dumps(msg) + "\n").encode())
+        self.stream.flush()
+        reply = json.loads(self.stream.readline())
+        if "error" in reply:
+            raise RuntimeError(f"Inference server error: {reply['error']}")
+        return reply
+
+    def predict(self, image_path):
+        """
+        Predicts (dx, dy) for the given image.
+        """
+        image = Image.open(image_path).convert('RGB').resize((self.input_size, self.input_size), Image.BILINEAR)
+        self.pixels[...] = np.asarray(image)
+        reply = self._call({"op": "predict", "shm": self.shm.name})
+        return reply["dx"], reply["dy"]
+
+    def reload(self) -> int:
+        """Ask the server to reload its checkpoint if the file changed. Returns how many models were reloaded."""
+        return self._call({"op": "reload"})["reloaded"]
+
+    def close(self):
+        del self.pixels
+        self.shm.close()
+        self.shm.unlink()
+        self.stream.close()
+        self.sock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared ImageShot inference server with micro-batching")
+    parser.add_argument("--socket", type=str, default=DEFAULT_SOCKET, help="Unix socket path")
+    parser.add_argument("--max-batch", type=int, default=32, help="Largest batch run in one forward pass")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="How long the first request of a batch waits for others")
+    parser.add_argument("--model", type=str, default="model/checkpoints/imageshot_model.pth", help="Path to model checkpoint")
+    parser.add_argument("--arch", type=str, default="imageshot", help="Model architecture (see model.imageshot.ARCHITECTURES)")
+    parser.add_argument("--input-size", type=int, default=128, help="Input resolution the model was trained at")
+    parser.add_argument("--separable", action="store_true", help="Use depthwise-separable convolutions")
+    args = parser.parse_args()
+
+    server = InferenceServer(socket_path=args.socket, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms,
+                             model_path=args.model, arch=args.arch, input_size=args.input_size,
+                             separable=args.separable)
+    server.serve_forever()
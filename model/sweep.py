@@ -0,0 +1,223 @@
+import argparse
+import csv
+import itertools
+import json
+import math
+import multiprocessing as mp
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import torch
+import torch.optim as optim
+
+from model.archbench import count_params, measure_latency
+from model.imageshot import build_model, checkpoint_path
+from model.training import CursorDataset, fit, make_loaders, make_transform, save_checkpoint
+
+# values tried for each hyperparameter; override with --space
+DEFAULT_SPACE = {
+    "lr": [3e-4, 1e-4, 3e-5],
+    "batch_size": [16, 32, 64],
+    "hidden_channels": [16, 32],
+    "input_size": [96, 128],
+    "arch": ["imageshot", "pooled", "heatmap"],
+    "separable": [False, True],
+}
+FIELDNAMES = ["trial", "rung", "epochs", "arch", "input_size", "separable", "hidden_channels", "lr",
+              "batch_size", "val_loss", "latency_ms", "latency_p95_ms", "params", "train_s", "checkpoint"]
+
+
+def sample_configs(space: dict, num_trials: int | None, seed: int = 0) -> list[dict]:
+    """
+    Every combination of the space when num_trials is None or covers it, else num_trials
+    combinations drawn without replacement.
+    """
+    keys = sorted(space)
+    grid = [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+    if num_trials is None or num_trials >= len(grid):
+        return grid
+    return random.Random(seed).sample(grid, num_trials)
+
+
+def _pin_worker(core_sets, threads):
+    """
+    Pool initializer: claim a disjoint set of cores for this worker process and size torch's
+    intra-op pool to it, so parallel trials don't fight over the same cores.
+    """
+    cores = core_sets.get()
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+
+def run_trial(trial: int, config: dict, epochs: int, data_dir: str, out_dir: str,
+              max_samples: int | None = None, seed: int = 0) -> dict:
+    """
+    Train one configuration for `epochs` more epochs, resuming model and optimizer state from
+    the trial's checkpoint if an earlier rung of the same configuration left one.
+    Returns the result row.
+    """
+    torch.manual_seed(seed + trial)
+    dataset = CursorDataset(os.path.join(data_dir, "labels.csv"), os.path.join(data_dir, "images"),
+                            transform=make_transform(config["input_size"]))
+    if max_samples is not None and max_samples < len(dataset):
+        dataset = torch.utils.data.Subset(dataset, range(max_samples))
+    # same seed for every trial, so all of them are scored on the same validation split
+    train_loader, val_loader = make_loaders(dataset, config["batch_size"],
+                                            generator=torch.Generator().manual_seed(seed))
+
+    device = torch.device("cpu")
+    model = build_model(config["arch"], output_dim=2, input_size=config["input_size"],
+                        separable=config["separable"], hidden_channels=config["hidden_channels"])
+    optimizer = optim.Adam(model.parameters(), lr=config["lr"])
+    ckpt = os.path.join(out_dir, f"trial_{trial:03d}.pth")
+    done_epochs = 0
+    if os.path.exists(ckpt):
+        state = torch.load(ckpt, map_location=device)
+        # a reused sweep directory may hold another sweep's trial with the same index
+        if state.get("config") == config:
+            model.load_state_dict(state["model"])
+            optimizer.load_state_dict(state["optimizer"])
+            done_epochs = state["epochs"]
+        else:
+            print(f"Trial {trial}: {ckpt} belongs to a different configuration, starting from scratch")
+
+    start = time.perf_counter()
+    history = fit(model, train_loader, val_loader, device, epochs, config["lr"], optimizer=optimizer)
+    train_s = time.perf_counter() - start
+    torch.save({"model": model.state_dict(), "optimizer": optimizer.state_dict(),
+                "epochs": done_epochs + epochs, "config": config}, ckpt)
+
+    latency, p95 = measure_latency(model, config["input_size"])
+    return dict(config, trial=trial, epochs=done_epochs + epochs, val_loss=history[-1][1],
+                latency_ms=latency, latency_p95_ms=p95, params=count_params(model),
+                train_s=train_s, checkpoint=ckpt)
+
+
+def successive_halving(configs: list[dict], data_dir: str = "model/data", out_dir: str = "model/sweeps/latest",
+                       min_epochs: int = 2, max_epochs: int = 32, eta: int = 3, workers: int | None = None,
+                       threads: int = 1, max_samples: int | None = None, seed: int = 0) -> list[dict]:
+    """
+    Train all configs for min_epochs, keep the best 1/eta by validation loss, train those up to
+    eta times as many epochs in total, and so on until max_epochs or one trial is left.
+    Trials run in parallel on `workers` processes with `threads` pinned cores each.
+    Every (trial, rung) result is appended to out_dir/results.csv; returns all rows.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    if workers is None:
+        workers = max(1, cpus // threads)
+    available = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(cpus))
+    ctx = mp.get_context("spawn")
+    manager = ctx.Manager()
+    core_sets = manager.Queue()
+    for w in range(workers):
+        core_sets.put({available[(w * threads + t) % len(available)] for t in range(threads)})
+
+    csv_path = os.path.join(out_dir, "results.csv")
+    with open(os.path.join(out_dir, "space.json"), 'w') as f:
+        json.dump({"configs": configs, "min_epochs": min_epochs, "max_epochs": max_epochs, "eta": eta}, f, indent=2)
+
+    rows = []
+    alive = list(enumerate(configs))
+    rung, trained, target = 0, 0, min_epochs
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_pin_worker,
+                             initargs=(core_sets, threads)) as pool, open(csv_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        while alive:
+            print(f"Rung {rung}: {len(alive)} trials, training to {target} epochs")
+            futures = [pool.submit(run_trial, i, cfg, target - trained, data_dir, out_dir, max_samples, seed)
+                       for i, cfg in alive]
+            results = [fut.result() for fut in futures]
+            for r in results:
+                r["rung"] = rung
+                writer.writerow({k: r[k] for k in FIELDNAMES})
+            f.flush()
+            rows += results
+
+            if len(alive) == 1 or target >= max_epochs:
+                break
+            keep = max(1, len(alive) // eta)
+            ranked = sorted(results, key=lambda r: r["val_loss"] if not math.isnan(r["val_loss"]) else math.inf)
+            survivors = {r["trial"] for r in ranked[:keep]}
+            alive = [(i, cfg) for i, cfg in alive if i in survivors]
+            rung, trained, target = rung + 1, target, min(max_epochs, target * eta)
+    manager.shutdown()
+    print(f"Results written to {csv_path}")
+    return rows
+
+
+def pareto_front(rows: list[dict]) -> list[dict]:
+    """Each trial's last result, kept if no other trial beats it on both val loss and latency."""
+    final = {}
+    for r in rows:
+        final[r["trial"]] = r
+    front = []
+    for r in final.values():
+        if not any(o["val_loss"] <= r["val_loss"] and o["latency_ms"] <= r["latency_ms"]
+                   and (o["val_loss"], o["latency_ms"]) != (r["val_loss"], r["latency_ms"])
+                   for o in final.values()):
+            front.append(r)
+    return sorted(front, key=lambda r: r["latency_ms"])
+
+
+def export_trial(row: dict, output_path: str | None = None) -> str:
+    """
+    Save a trial's weights as a bare state dict, the format CursorPredictor and ModelRegistry
+    load, at output_path or the configuration's default checkpoint_path. Returns the path.
+    """
+    state = torch.load(row["checkpoint"], map_location="cpu")
+    config = state["config"]
+    model = build_model(config["arch"], output_dim=2, input_size=config["input_size"],
+                        separable=config["separable"], hidden_channels=config["hidden_channels"])
+    model.load_state_dict(state["model"])
+    if output_path is None:
+        output_path = checkpoint_path(config["arch"], config["input_size"], config["separable"],
+                                      config["hidden_channels"])
+    save_checkpoint(model, output_path)
+    return output_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel ImageShot hyperparameter sweep with successive halving")
+    parser.add_argument("--space", type=str, default=None, help="JSON file mapping hyperparameter -> list of values")
+    parser.add_argument("--trials", type=int, default=None, help="Random subset of the grid to try (default: all)")
+    parser.add_argument("--data", type=str, default="model/data", help="Dataset directory")
+    parser.add_argument("--out", type=str, default=None, help="Sweep directory (default model/sweeps/<timestamp>)")
+    parser.add_argument("--min-epochs", type=int, default=2, help="Epochs in the first rung")
+    parser.add_argument("--max-epochs", type=int, default=32, help="Epoch budget of the last rung")
+    parser.add_argument("--eta", type=int, default=3, help="Keep 1/eta of the trials per rung")
+    parser.add_argument("--threads", type=int, default=1, help="Cores pinned per trial")
+    parser.add_argument("--workers", type=int, default=None, help="Parallel trials (default: cores / threads)")
+    parser.add_argument("--max-samples", type=int, default=None, help="Train on the first N samples only")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for sampling and the validation split")
+    parser.add_argument("--export", nargs="?", const="", default=None, metavar="PATH",
+                        help="Save the lowest-loss trial as a loadable checkpoint (default path for its configuration)")
+    args = parser.parse_args()
+
+    space = DEFAULT_SPACE
+    if args.space:
+        with open(args.space, 'r') as f:
+            space = dict(DEFAULT_SPACE, **json.load(f))
+    configs = sample_configs(space, args.trials, args.seed)
+    out_dir = args.out or os.path.join("model/sweeps", time.strftime("%Y%m%d-%H%M%S"))
+    rows = successive_halving(configs, args.data, out_dir, args.min_epochs, args.max_epochs, args.eta,
+                              args.workers, args.threads, args.max_samples, args.seed)
+
+    print("\nPareto front (val loss vs latency):")
+    print(f"{'trial':>5} {'arch':<10} {'size':>4} {'sep':>3} {'hid':>3} {'lr':>7} {'bs':>3} "
+          f"{'epochs':>6} {'val loss':>9} {'ms':>7}")
+    for r in pareto_front(rows):
+        print(f"{r['trial']:>5} {r['arch']:<10} {r['input_size']:>4} {'y' if r['separable'] else 'n':>3} "
+              f"{r['hidden_channels']:>3} {r['lr']:>7.0e} {r['batch_size']:>3} {r['epochs']:>6} "
+              f"{r['val_loss']:>9.5f} {r['latency_ms']:>7.2f}")
+
+    if args.export is not None:
+        final = {r["trial"]: r for r in rows}.values()
+        best = min(final, key=lambda r: r["val_loss"] if not math.isnan(r["val_loss"]) else math.inf)
+        path = export_trial(best, args.export or None)
+        print(f"\nExported trial {best['trial']} (val loss {best['val_loss']:.5f}) to {path}")
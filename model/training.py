@@ -6,7 +6,7 @@ import torch.optim as optim
 from torch.utils.data import Dataset, DataLoader
 from torchvision import transforms
 from PIL import Image
-from model.imageshot import ImageShotModel
+from model.imageshot import build_model, checkpoint_path
 
 class CursorDataset(Dataset):
     def __init__(self, csv_file, root_dir, transform=None):
@@ -39,39 +39,49 @@ class CursorDataset(Dataset):
 
         return image, targets
 
-def train():
-    # Hyperparameters
-    batch_size = 32
-    learning_rate = 1e-4  # Reduced LR
-    num_epochs = 50       # Increased epochs
-    
-    # Data Setup
-    transform = transforms.Compose([
-        transforms.Resize((128, 128)), 
+def make_transform(input_size=128):
+    return transforms.Compose([
+        transforms.Resize((input_size, input_size)), 
         transforms.ToTensor(),
     ])
-    
-    dataset = CursorDataset(
-        csv_file='model/data/labels.csv',
-        root_dir='model/data/images',
-        transform=transform
-    )
-    
-    # Split train/val
-    train_size = int(0.8 * len(dataset))
-    val_size = len(dataset) - train_size
-    train_dataset, val_dataset = torch.utils.data.random_split(dataset, [train_size, val_size])
+
+def make_loaders(dataset, batch_size=32, val_fraction=0.2, generator=None):
+    """
+    Splits a dataset into shuffled train and ordered validation loaders.
+    """
+    val_size = int(val_fraction * len(dataset))
+    train_size = len(dataset) - val_size
+    train_dataset, val_dataset = torch.utils.data.random_split(dataset, [train_size, val_size], generator=generator)
     
     train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True)
     val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False)
-    
-    # Model Setup
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    print(f"Using device: {device}")
-    
-    model = ImageShotModel(output_dim=2).to(device)
+    return train_loader, val_loader
+
+def evaluate(model, loader, criterion, device):
+    """
+    Mean loss over a loader (NaN if it is empty).
+    """
+    model.eval()
+    total, n = 0.0, 0
+    with torch.no_grad():
+        for images, targets in loader:
+            images = images.to(device)
+            targets = targets.to(device)
+            outputs = model(images)
+            loss = criterion(outputs, targets)
+            total += loss.item() * images.size(0)
+            n += images.size(0)
+    return total / n if n else float("nan")
+
+def fit(model, train_loader, val_loader, device, num_epochs=50, learning_rate=1e-4, optimizer=None):
+    """
+    Adam + MSE training loop. Returns the per-epoch history as (train_loss, val_loss) tuples.
+    Pass an existing optimizer to continue a previous run with its state.
+    """
     criterion = nn.MSELoss()
-    optimizer = optim.Adam(model.parameters(), lr=learning_rate)
+    if optimizer is None:
+        optimizer = optim.Adam(model.parameters(), lr=learning_rate)
+    history = []
     
     # Training Loop
     for epoch in range(num_epochs):
@@ -90,27 +100,67 @@ def train():
             
             running_loss += loss.item() * images.size(0)
             
-        epoch_loss = running_loss / len(train_dataset)
+        epoch_loss = running_loss / len(train_loader.dataset)
         
         # Validation
-        model.eval()
-        val_loss = 0.0
-        with torch.no_grad():
-            for images, targets in val_loader:
-                images = images.to(device)
-                targets = targets.to(device)
-                outputs = model(images)
-                loss = criterion(outputs, targets)
-                val_loss += loss.item() * images.size(0)
-        
-        val_loss /= len(val_dataset)
+        val_loss = evaluate(model, val_loader, criterion, device)
         
         print(f"Epoch [{epoch+1}/{num_epochs}], Train Loss: {epoch_loss:.4f}, Val Loss: {val_loss:.4f}")
+        history.append((epoch_loss, val_loss))
+    return history
+
+def save_checkpoint(model, output_path):
+    """
+    Writes a temp file next to output_path and renames it over the old checkpoint, so processes
+    that memory-mapped the old file keep a valid inode and never see a half-written one.
+    """
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    tmp = f"{output_path}.tmp{os.getpid()}"
+    try:
+        torch.save(model.state_dict(), tmp)
+        os.replace(tmp, output_path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    print(f"Model saved to {output_path}")
+
+def train(arch="imageshot", input_size=128, separable=False, hidden_channels=32, output_path=None,
+          data_dir="model/data", batch_size=32, learning_rate=1e-4, num_epochs=50):
+    # Data Setup
+    dataset = CursorDataset(
+        csv_file=os.path.join(data_dir, 'labels.csv'),
+        root_dir=os.path.join(data_dir, 'images'),
+        transform=make_transform(input_size)
+    )
+    train_loader, val_loader = make_loaders(dataset, batch_size)
+    
+    # Model Setup
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    print(f"Using device: {device}")
+    
+    model = build_model(arch, output_dim=2, input_size=input_size,
+                        separable=separable, hidden_channels=hidden_channels).to(device)
+    history = fit(model, train_loader, val_loader, device, num_epochs, learning_rate)
         
     # Save Model
-    os.makedirs("model/checkpoints", exist_ok=True)
-    torch.save(model.state_dict(), "model/checkpoints/imageshot_model.pth")
-    print("Model saved to model/checkpoints/imageshot_model.pth")
+    if output_path is None:
+        output_path = checkpoint_path(arch, input_size, separable, hidden_channels)
+    save_checkpoint(model, output_path)
+    return history
 
 if __name__ == "__main__":
-    train()
+    import argparse
+    parser = argparse.ArgumentParser(description="Train ImageShot cursor model")
+    parser.add_argument("--arch", type=str, default="imageshot", help="Model architecture (see model.imageshot.ARCHITECTURES)")
+    parser.add_argument("--input-size", type=int, default=128, help="Input resolution")
+    parser.add_argument("--separable", action="store_true", help="Use depthwise-separable convolutions")
+    parser.add_argument("--hidden-channels", type=int, default=32, help="Width of the first conv block")
+    parser.add_argument("--output", type=str, default=None, help="Checkpoint path (default depends on the configuration)")
+    parser.add_argument("--data", type=str, default="model/data", help="Dataset directory with labels.csv and images/")
+    parser.add_argument("--batch-size", type=int, default=32, help="Batch size")
+    parser.add_argument("--lr", type=float, default=1e-4, help="Learning rate")
+    parser.add_argument("--epochs", type=int, default=50, help="Number of epochs")
+    args = parser.parse_args()
+    train(arch=args.arch, input_size=args.input_size, separable=args.separable,
+          hidden_channels=args.hidden_channels, output_path=args.output, data_dir=args.data,
+          batch_size=args.batch_size, learning_rate=args.lr, num_epochs=args.epochs)